@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from werkzeug.exceptions import ServiceUnavailable
+from service.event_types import EVENT_TYPES
+from util.singleton import singleton
+import threading
+import math
+import os
+
+@singleton
+class Admission:
+    # Bounds the recommendation requests running per event type so a burst of
+    # slow fits for one type cannot take every worker thread. Requests over the
+    # limit queue for up to the timeout and are then turned away with a 503.
+    def __init__(self):
+        self.limit = int(os.environ.get('REQUEST_CONCURRENCY_PER_TYPE', 4))
+        self.timeout = float(os.environ.get('REQUEST_QUEUE_TIMEOUT_SECONDS', 2))
+        self.semaphores = {event_type: threading.BoundedSemaphore(self.limit) for event_type in EVENT_TYPES}
+
+        self.lock = threading.Lock()
+        self.running = dict.fromkeys(EVENT_TYPES, 0)
+        self.waiting = dict.fromkeys(EVENT_TYPES, 0)
+        self.rejected = dict.fromkeys(EVENT_TYPES, 0)
+
+    @contextmanager
+    def admit(self, event_type):
+        with self.lock:
+            self.waiting[event_type] += 1
+        acquired = self.semaphores[event_type].acquire(timeout=self.timeout)
+        with self.lock:
+            self.waiting[event_type] -= 1
+            if acquired:
+                self.running[event_type] += 1
+            else:
+                self.rejected[event_type] += 1
+        if not acquired:
+            raise ServiceUnavailable(retry_after=math.ceil(self.timeout))
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.running[event_type] -= 1
+            self.semaphores[event_type].release()
+
+    def stats(self):
+        with self.lock:
+            return {
+                event_type: {
+                    "limit": self.limit,
+                    "running": self.running[event_type],
+                    "waiting": self.waiting[event_type],
+                    "rejected": self.rejected[event_type],
+                }
+                for event_type in EVENT_TYPES
+            }
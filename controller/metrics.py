@@ -0,0 +1,108 @@
+from flask import Response, g, request
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from repository.backends import backend_configured, event_repository
+from service.event_types import EVENT_TYPES
+from service.model_cache import ModelCache
+from service.catalog_cache import CatalogCache
+from service.training_pool import TrainingPool
+from util.timing import addObserver
+import time
+import os
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'recommendation_engine')
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+registry = CollectorRegistry()
+
+http_requests_total = Counter(
+    "http_requests_total", "Total number of HTTP requests",
+    ["endpoint", "method", "status", "event_type"], namespace=NAMESPACE, registry=registry)
+http_requests_duration_seconds = Histogram(
+    "http_requests_duration_seconds", "HTTP request duration in seconds for all requests",
+    ["endpoint", "method", "status", "event_type"], namespace=NAMESPACE, registry=registry)
+pipeline_stage_duration_seconds = Histogram(
+    "pipeline_stage_duration_seconds", "Duration of each recommendation pipeline stage in seconds",
+    ["stage"], namespace=NAMESPACE, registry=registry, buckets=STAGE_BUCKETS)
+
+# Label lookups take a lock, so the per-stage children are resolved once.
+stage_histograms = {}
+
+def observe_stage(stage, elapsed):
+    histogram = stage_histograms.get(stage)
+    if histogram is None:
+        histogram = stage_histograms.setdefault(stage, pipeline_stage_duration_seconds.labels(stage))
+    histogram.observe(elapsed)
+
+class CacheCollector:
+    # Read at scrape time from the components' own counters rather than
+    # instrumenting every cache lookup.
+    def collect(self):
+        model_cache = ModelCache().stats()
+        lookups = CounterMetricFamily(f"{NAMESPACE}_model_cache_lookups", "Model cache lookups", labels=["result"])
+        lookups.add_metric(["hit"], model_cache["hits"])
+        lookups.add_metric(["miss"], model_cache["misses"])
+        lookups.add_metric(["stale"], model_cache["stale_hits"])
+        yield lookups
+
+        total = model_cache["hits"] + model_cache["misses"]
+        yield GaugeMetricFamily(f"{NAMESPACE}_model_cache_hit_ratio", "Model cache hit ratio",
+                                value=model_cache["hits"] / total if total else 0.0)
+        yield GaugeMetricFamily(f"{NAMESPACE}_model_cache_entries", "Models held in the cache", value=model_cache["entries"])
+        yield GaugeMetricFamily(f"{NAMESPACE}_model_cache_bytes", "Pickled size of cached models", value=model_cache["bytes"])
+        yield CounterMetricFamily(f"{NAMESPACE}_model_cache_evictions", "Models evicted from the cache",
+                                  value=model_cache["evictions"])
+
+        catalog_events = GaugeMetricFamily(f"{NAMESPACE}_catalog_events", "Upcoming events in the catalog cache",
+                                           labels=["event_type"])
+        for event_type, catalog in CatalogCache().stats().items():
+            catalog_events.add_metric([event_type], catalog["events"])
+        yield catalog_events
+
+        yield GaugeMetricFamily(f"{NAMESPACE}_training_inflight", "Training jobs in flight",
+                                value=TrainingPool().stats()["inflight"])
+
+        if backend_configured():
+            pool = event_repository().getPoolStats()
+            yield GaugeMetricFamily(f"{NAMESPACE}_db_pool_checked_out", "Database connections checked out",
+                                    value=pool["checked_out"])
+            yield GaugeMetricFamily(f"{NAMESPACE}_db_pool_checkout_wait_max_seconds",
+                                    "Longest wait for a database connection", value=pool["checkout_wait_max"])
+
+registry.register(CacheCollector())
+
+def init_metrics(app):
+    addObserver(observe_stage)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        if request.url_rule is None:
+            return response
+        event_type = (request.view_args or {}).get('event_type', '')
+        labels = (
+            request.url_rule.rule,
+            request.method,
+            str(response.status_code),
+            # Taken from the URL, so only known types become label values.
+            event_type if event_type in EVENT_TYPES else 'unknown' if event_type else '',
+        )
+        http_requests_total.labels(*labels).inc()
+        http_requests_duration_seconds.labels(*labels).observe(time.perf_counter() - g.request_started)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            scrape_registry = CollectorRegistry()
+            MultiProcessCollector(scrape_registry)
+            # Cache and pool figures are those of the worker serving the scrape.
+            scrape_registry.register(CacheCollector())
+        else:
+            scrape_registry = registry
+        return Response(generate_latest(scrape_registry), mimetype=CONTENT_TYPE_LATEST)
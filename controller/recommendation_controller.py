@@ -1,19 +1,98 @@
-from flask import Flask, request
-from service.group_recommendation import make_group_recommendation
+from flask import Flask, request, abort
+from service.group_recommendation import make_group_recommendation, GROUP_STRATEGIES
 from service.single_recommendation import make_recommendation
-from service.content_based import crossValidate
+from service.evaluation import latestReport
+from service.model_cache import ModelCache
+from service.catalog_cache import CatalogCache
+from service.training_pool import TrainingPool
+from service.global_models import GlobalModels
+from service.event_types import EVENT_TYPES
+from repository.backends import event_repository
+from controller.admission import Admission
+from controller.metrics import init_metrics
+import os
 app = Flask(__name__)
+init_metrics(app)
+
+def warm_up():
+    # Under gunicorn this runs in the master before forking, so the workers
+    # share the loaded models and catalogs copy-on-write.
+    GlobalModels().warmUp()
+    for spec in EVENT_TYPES.values():
+        CatalogCache().get(spec)
+
+if os.environ.get('MODEL_WARMUP', 'false').lower() == 'true':
+    warm_up()
 
 @app.route("/cross-validation")
 def cross_validate():
-    return crossValidate()
+    reports, pending = latestReport(refresh=request.args.get('refresh', 'false').lower() == 'true')
+    if pending:
+        # Accepted: missing reports, and those older than the current ratings, are
+        # computed in the background; poll again. Outdated reports are still listed.
+        return {"reports": reports, "pending": pending}, 202
+    return reports
+
+@app.route("/stats/pool")
+def pool_stats():
+    return event_repository().getPoolStats()
+
+@app.route("/stats/model-cache")
+def model_cache_stats():
+    return ModelCache().stats()
+
+@app.route("/stats/training")
+def training_stats():
+    return TrainingPool().stats()
+
+@app.route("/stats/global-models")
+def global_model_stats():
+    return GlobalModels().stats()
+
+@app.route("/stats/catalog")
+def catalog_stats():
+    return CatalogCache().stats()
+
+@app.route("/stats/admission")
+def admission_stats():
+    return Admission().stats()
+
+@app.route("/catalog/<event_type>/refresh", methods=["POST"])
+def refresh_catalog(event_type):
+    if event_type not in EVENT_TYPES:
+        abort(404)
+    CatalogCache().refresh(EVENT_TYPES[event_type])
+    return CatalogCache().stats()
+
+def page_args():
+    # request.args.get(..., type=int) would drop a malformed value and serve
+    # the whole catalog, so parse explicitly and reject it.
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        abort(400)
+    if (limit is not None and limit < 0) or offset < 0:
+        abort(400)
+    return limit, offset
 
 @app.route("/events/<event_type>/predict/rate/<int:user_id>")
 def single_recommendation(event_type, user_id):
-    return make_recommendation(event_type, user_id)
+    if event_type not in EVENT_TYPES:
+        abort(404)
+    limit, offset = page_args()
+    with Admission().admit(event_type):
+        return make_recommendation(event_type, user_id, limit, offset)
 
 @app.route("/events/<event_type>/predict/rate")
 def group_recommendation(event_type):
+    if event_type not in EVENT_TYPES:
+        abort(404)
+    limit, offset = page_args()
+    strategy = request.args.get('strategy', 'average')
+    if strategy not in GROUP_STRATEGIES:
+        abort(400)
     users = request.args.getlist('users')
     user_ids = [int(user_id) for user_id in users]
-    return make_group_recommendation(event_type, user_ids)
\ No newline at end of file
+    with Admission().admit(event_type):
+        return make_group_recommendation(event_type, user_ids, limit, offset, strategy)
\ No newline at end of file
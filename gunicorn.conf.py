@@ -0,0 +1,60 @@
+import multiprocessing
+import tempfile
+import shutil
+import gc
+import os
+
+wsgi_app = os.environ.get('GUNICORN_APP', 'controller.recommendation_controller:app')
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Threaded workers: database I/O waits on a worker thread while fitting runs in
+# the training pool's processes, and the app is loaded once in the master.
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', max(2, multiprocessing.cpu_count() // 2)))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+preload_app = True
+
+# Warm-up happens in when_ready instead of at import, where it could start
+# training pool processes in the master.
+warm_up_models = os.environ.get('MODEL_WARMUP', 'true').lower() == 'true'
+os.environ['MODEL_WARMUP'] = 'false'
+
+# Every worker writes its Prometheus samples here and /metrics merges them. The
+# directory has to exist before the app, and with it prometheus_client, is imported.
+metrics_directory = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'recommendation-engine-metrics'))
+shutil.rmtree(metrics_directory, ignore_errors=True)
+os.makedirs(metrics_directory, exist_ok=True)
+
+def when_ready(server):
+    if not warm_up_models:
+        return
+    from controller.recommendation_controller import warm_up
+    from service.training_pool import TrainingPool
+
+    # Train inline so the master never starts pool processes the workers would inherit.
+    training_pool = TrainingPool()
+    training_workers, training_pool.workers = training_pool.workers, 0
+    try:
+        warm_up()
+    except Exception:
+        server.log.exception("Warm-up failed, workers will load models and catalogs on demand")
+    finally:
+        training_pool.workers = training_workers
+    # Keep the warmed objects out of the collector so it does not dirty their pages.
+    gc.freeze()
+
+def post_fork(server, worker):
+    from repository.backends import backend_configured, event_repository
+
+    # Connections opened by the master must not be shared across processes.
+    if backend_configured():
+        event_repository().afterFork()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,50 @@
+-- Precomputed catalog features and the indexes behind the recommendation queries.
+--
+-- Run with psql outside a transaction (CREATE INDEX CONCURRENTLY cannot run in
+-- one), then set CATALOG_FEATURE_COLUMNS=true so the catalog query reads the
+-- stored columns instead of computing them for every row.
+--
+-- Adding a stored generated column rewrites the table. The expressions must be
+-- immutable: if start_date/end_date are timestamptz, extract the hour from
+-- (start_date AT TIME ZONE 'UTC') instead, matching the server's TimeZone.
+
+ALTER TABLE event_musical
+    ADD COLUMN IF NOT EXISTS price_missing boolean GENERATED ALWAYS AS (price IS NULL) STORED,
+    ADD COLUMN IF NOT EXISTS start_hour smallint GENERATED ALWAYS AS (EXTRACT(HOUR FROM start_date)::smallint) STORED,
+    ADD COLUMN IF NOT EXISTS end_hour smallint GENERATED ALWAYS AS (EXTRACT(HOUR FROM end_date)::smallint) STORED;
+
+ALTER TABLE event_sport
+    ADD COLUMN IF NOT EXISTS price_missing boolean GENERATED ALWAYS AS (price IS NULL) STORED,
+    ADD COLUMN IF NOT EXISTS start_hour smallint GENERATED ALWAYS AS (EXTRACT(HOUR FROM start_date)::smallint) STORED,
+    ADD COLUMN IF NOT EXISTS end_hour smallint GENERATED ALWAYS AS (EXTRACT(HOUR FROM end_date)::smallint) STORED;
+
+ALTER TABLE event_nature
+    ADD COLUMN IF NOT EXISTS price_missing boolean GENERATED ALWAYS AS (price IS NULL) STORED,
+    ADD COLUMN IF NOT EXISTS start_hour smallint GENERATED ALWAYS AS (EXTRACT(HOUR FROM start_date)::smallint) STORED,
+    ADD COLUMN IF NOT EXISTS end_hour smallint GENERATED ALWAYS AS (EXTRACT(HOUR FROM end_date)::smallint) STORED;
+
+ALTER TABLE event_stage_play
+    ADD COLUMN IF NOT EXISTS price_missing boolean GENERATED ALWAYS AS (price IS NULL) STORED,
+    ADD COLUMN IF NOT EXISTS start_hour smallint GENERATED ALWAYS AS (EXTRACT(HOUR FROM start_date)::smallint) STORED,
+    ADD COLUMN IF NOT EXISTS end_hour smallint GENERATED ALWAYS AS (EXTRACT(HOUR FROM end_date)::smallint) STORED;
+
+-- Upcoming public events within the horizon, answered from the index alone.
+-- The predicate matches the catalog query's "private IS NOT TRUE" filter
+-- (CATALOG_INCLUDE_PRIVATE=false, the default).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS event_musical_upcoming_idx ON event_musical (start_date)
+    INCLUDE (id, event_type, category, price_missing, start_hour, end_hour, private)
+    WHERE private IS NOT TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS event_sport_upcoming_idx ON event_sport (start_date)
+    INCLUDE (id, event_type, category, price_missing, start_hour, end_hour, private)
+    WHERE private IS NOT TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS event_nature_upcoming_idx ON event_nature (start_date)
+    INCLUDE (id, event_type, category, price_missing, start_hour, end_hour, private)
+    WHERE private IS NOT TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS event_stage_play_upcoming_idx ON event_stage_play (start_date)
+    INCLUDE (id, event_type, category, price_missing, start_hour, end_hour, private)
+    WHERE private IS NOT TRUE;
+
+-- Per-user ratings, watermarks and already-rated events. The cursor column
+-- (EVENT_RATE_CURSOR_COLUMN, id by default) is included for the watermark query.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS event_rate_user_idx ON event_rate (user_id, event_type, event_id)
+    INCLUDE (id, rate);
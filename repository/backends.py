@@ -0,0 +1,23 @@
+from repository.event_repository import EventRepository
+from repository.sqlite_repository import SqliteEventRepository
+from repository.snapshot_repository import SnapshotRepository
+import os
+
+REPOSITORY_BACKENDS = {
+    'postgres': EventRepository,
+    'sqlite': SqliteEventRepository,
+    'snapshot': SnapshotRepository,
+}
+
+def backend_name():
+    return os.environ.get('REPOSITORY_BACKEND', 'postgres')
+
+def backend_configured():
+    # The Postgres repository cannot be created without its connection settings.
+    return backend_name() != 'postgres' or 'DATABASE_ENDPOINT' in os.environ
+
+def event_repository():
+    backend = backend_name()
+    if backend not in REPOSITORY_BACKENDS:
+        raise ValueError(f"unknown repository backend {backend!r}")
+    return REPOSITORY_BACKENDS[backend]()
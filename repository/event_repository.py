@@ -1,10 +1,12 @@
 import pandas as pd
 from sqlalchemy import create_engine
+from repository.pooled_repository import PooledRepository
+from repository.ratings_batch import RatingsBatch
 from util.singleton import singleton
 import os
 
 @singleton
-class EventRepository:
+class EventRepository(PooledRepository):
     def __init__(self):
         self.database = os.environ['DATABASE_NAME']
         self.url = os.environ['DATABASE_ENDPOINT']
@@ -13,195 +15,173 @@ class EventRepository:
 
         self.connection_string = f"postgresql://{self.user}:{self.password}@{self.url}/{self.database}"
 
-    def getMusicalEventRatesUser(self, user_id):
-        engine = create_engine(self.connection_string)
-        query = """
-                SELECT eb.category,
-                    (CASE WHEN price IS NULL THEN true ELSE false END) as price,
-                    EXTRACT(HOUR FROM start_date)                                             as start_date,
-                    EXTRACT(HOUR FROM end_date)                                               as end_date,
-                    eb.private,
-                    er.rate
-                FROM event_rate er
-                        INNER JOIN event_musical eb ON er.event_type = eb.event_type AND er.event_id = eb.id
-                WHERE user_id in (%s)
-                ORDER BY random();
-                """
-        data_frame = pd.read_sql(query, engine, params=(user_id,))
-        return data_frame
+        super().__init__(create_engine(
+            self.connection_string,
+            pool_size=int(os.environ.get('DATABASE_POOL_SIZE', 5)),
+            max_overflow=int(os.environ.get('DATABASE_POOL_MAX_OVERFLOW', 10)),
+            pool_timeout=float(os.environ.get('DATABASE_POOL_TIMEOUT', 30)),
+            pool_recycle=int(os.environ.get('DATABASE_POOL_RECYCLE', 1800)),
+            pool_pre_ping=os.environ.get('DATABASE_POOL_PRE_PING', 'true').lower() == 'true',
+        ))
 
-    def getSportEventRatesUser(self, user_id):
-        engine = create_engine(self.connection_string)
-        query = """
-                SELECT eb.category,
-                    (CASE WHEN price IS NULL THEN true ELSE false END) as price,
-                    EXTRACT(HOUR FROM start_date)                                             as start_date,
-                    EXTRACT(HOUR FROM end_date)                                               as end_date,
-                    eb.private,
-                    er.rate
-                FROM event_rate er
-                        INNER JOIN event_sport eb ON er.event_type = eb.event_type AND er.event_id = eb.id
-                WHERE user_id in (%s)
-                ORDER BY random();
-                """
-        data_frame = pd.read_sql(query, engine, params=(user_id,))
-        return data_frame
-    def getNatureEventRatesUser(self, user_id):
-        engine = create_engine(self.connection_string)
-        query = """
-                SELECT eb.category,
-                    (CASE WHEN price IS NULL THEN true ELSE false END) as price,
-                    EXTRACT(HOUR FROM start_date)                                             as start_date,
-                    EXTRACT(HOUR FROM end_date)                                               as end_date,
-                    eb.private,
-                    er.rate
+        self.stream_buffer = int(os.environ.get('DATABASE_STREAM_BUFFER', 5000))
+        # Monotonic event_rate column used as the high-water mark for incremental training.
+        self.rate_cursor = os.environ.get('EVENT_RATE_CURSOR_COLUMN', 'id')
+        # Event type -> TABLESAMPLE percent that last filled its sample.
+        self.sample_percents = {}
+        # Set once migrations/001_catalog_feature_columns.sql has been applied.
+        self.feature_columns = os.environ.get('CATALOG_FEATURE_COLUMNS', 'false').lower() == 'true'
+
+    def getRatedUserIds(self, spec):
+        query = f"""
+                SELECT DISTINCT er.user_id
                 FROM event_rate er
-                        INNER JOIN event_nature eb ON er.event_type = eb.event_type AND er.event_id = eb.id
-                WHERE user_id in (%s)
-                ORDER BY random();
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id;
                 """
-        data_frame = pd.read_sql(query, engine, params=(user_id,))
-        return data_frame
-    def getStagePlayEventRatesUser(self, user_id):
-        engine = create_engine(self.connection_string)
-        query = """
-                SELECT eb.category,
+        with self.connect() as connection:
+            data_frame = pd.read_sql(query, connection)
+        return data_frame["user_id"].tolist()
+
+    def getEventRatesForUsers(self, specs, user_ids, since=None, until=None):
+        # One round trip for any number of users and event types; the event type
+        # name is added as a discriminator column to each branch of the UNION ALL.
+        window = ""
+        if since is not None:
+            window += f" AND er.{self.rate_cursor} > %(since)s"
+        if until is not None:
+            window += f" AND er.{self.rate_cursor} <= %(until)s"
+        query = "\n                UNION ALL\n".join(f"""
+                SELECT '{spec.name}'                                                          as event_type,
+                    er.user_id,
+                    er.event_id,
+                    eb.category,
                     (CASE WHEN price IS NULL THEN true ELSE false END) as price,
                     EXTRACT(HOUR FROM start_date)                                             as start_date,
                     EXTRACT(HOUR FROM end_date)                                               as end_date,
                     eb.private,
-                    er.rate
+                    er.rate,
+                    er.{self.rate_cursor}                                                    as cursor
                 FROM event_rate er
-                        INNER JOIN event_stage_play eb ON er.event_type = eb.event_type AND er.event_id = eb.id
-                WHERE user_id in (%s)
-                ORDER BY random();
-                """
-        data_frame = pd.read_sql(query, engine, params=(user_id,))
-        return data_frame
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id
+                WHERE er.user_id = ANY(%(user_ids)s){window}""" for spec in specs)
 
-    def getMusicalEventRates(self):
-        engine = create_engine(self.connection_string)
-        query = """
-                SELECT eb.category,
-                    (CASE WHEN price IS NULL THEN true ELSE false END) as price,
-                    EXTRACT(HOUR FROM start_date)                                             as start_date,
-                    EXTRACT(HOUR FROM end_date)                                               as end_date,
-                    eb.private,
-                    er.rate
+        with self.connect() as connection:
+            result = connection.execution_options(stream_results=True, max_row_buffer=self.stream_buffer) \
+                .exec_driver_sql(query, {"user_ids": list(user_ids), "since": since, "until": until})
+            return RatingsBatch(specs, result.partitions(self.stream_buffer))
+
+    def getRatingWatermarks(self, spec, user_ids):
+        query = f"""
+                SELECT er.user_id, count(*) as ratings, max(er.{self.rate_cursor}) as watermark
                 FROM event_rate er
-                        INNER JOIN event_musical eb ON er.event_type = eb.event_type AND er.event_id = eb.id
-                ORDER BY random()
-                LIMIT 1500;
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id
+                WHERE er.user_id = ANY(%s)
+                GROUP BY er.user_id;
                 """
-        data_frame = pd.read_sql(query, engine)
-        return data_frame
-    def getSportEventRates(self):
-        engine = create_engine(self.connection_string)
-        query = """
-                SELECT eb.category,
-                    (CASE WHEN price IS NULL THEN true ELSE false END) as price,
-                    EXTRACT(HOUR FROM start_date)                                             as start_date,
-                    EXTRACT(HOUR FROM end_date)                                               as end_date,
-                    eb.private,
-                    er.rate
+        with self.connect() as connection:
+            rows = connection.exec_driver_sql(query, (list(user_ids),)).fetchall()
+        return {user_id: (count, watermark) for user_id, count, watermark in rows}
+
+    def getRatingsVersion(self, spec):
+        # Changes whenever ratings are added or removed; keys cached evaluations.
+        query = f"""
+                SELECT count(*) as ratings, max(er.{self.rate_cursor}) as watermark
                 FROM event_rate er
-                        INNER JOIN event_sport eb ON er.event_type = eb.event_type AND er.event_id = eb.id
-                ORDER BY random()
-                LIMIT 1500;
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id;
                 """
-        data_frame = pd.read_sql(query, engine)
-        return data_frame
-    def getNatureEventRates(self):
-        engine = create_engine(self.connection_string)
-        query = """
+        with self.connect() as connection:
+            count, watermark = connection.exec_driver_sql(query).fetchone()
+        return count, watermark
+
+    def getEventRatesSample(self, spec, limit=1500):
+        # TABLESAMPLE reads only a fraction of event_rate's pages instead of sorting
+        # the whole join; the small sample is then shuffled and trimmed. The first
+        # percent assumes the type holds all of event_rate; a short sample is taken
+        # again at a percent scaled by the shortfall, up to a full scan, and the
+        # percent that filled it is kept for the type's next sample.
+        oversample = float(os.environ.get('DATABASE_SAMPLE_OVERSAMPLE', 4))
+        query = f"""
                 SELECT eb.category,
                     (CASE WHEN price IS NULL THEN true ELSE false END) as price,
                     EXTRACT(HOUR FROM start_date)                                             as start_date,
                     EXTRACT(HOUR FROM end_date)                                               as end_date,
                     eb.private,
                     er.rate
-                FROM event_rate er
-                        INNER JOIN event_nature eb ON er.event_type = eb.event_type AND er.event_id = eb.id
+                FROM event_rate er TABLESAMPLE BERNOULLI (%s)
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id
                 ORDER BY random()
-                LIMIT 1500;
+                LIMIT %s;
                 """
-        data_frame = pd.read_sql(query, engine)
+        with self.connect() as connection:
+            percent = self.sample_percents.get(spec.name)
+            if percent is None:
+                estimated_rows = connection.exec_driver_sql(
+                    "SELECT reltuples FROM pg_class WHERE oid = 'event_rate'::regclass;"
+                ).scalar()
+                percent = 100.0
+                if estimated_rows and estimated_rows > 0:
+                    percent = min(100.0, 100.0 * limit * oversample / estimated_rows)
+
+            while True:
+                data_frame = pd.read_sql(query, connection, params=(percent, limit))
+                if len(data_frame) >= limit or percent >= 100.0:
+                    break
+                percent = min(100.0, percent * oversample * limit / max(1, len(data_frame)))
+        self.sample_percents[spec.name] = percent
         return data_frame
-    def getStagePlayEventRates(self):
-        engine = create_engine(self.connection_string)
-        query = """
-                SELECT eb.category,
-                    (CASE WHEN price IS NULL THEN true ELSE false END) as price,
-                    EXTRACT(HOUR FROM start_date)                                             as start_date,
-                    EXTRACT(HOUR FROM end_date)                                               as end_date,
-                    eb.private,
-                    er.rate
+
+    def getRatedEventIds(self, spec, user_ids):
+        # Only upcoming events can appear in a ranking, so older ratings are skipped.
+        query = f"""
+                SELECT DISTINCT er.event_id
                 FROM event_rate er
-                        INNER JOIN event_stage_play eb ON er.event_type = eb.event_type AND er.event_id = eb.id
-                ORDER BY random()
-                LIMIT 1500;
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id
+                WHERE er.user_id = ANY(%s) AND eb.start_date > now();
                 """
-        data_frame = pd.read_sql(query, engine)
-        return data_frame
-    
-    def getUpcomingMusicalEvents(self):
-        engine = create_engine(self.connection_string)
-        query = """
+        with self.connect() as connection:
+            rows = connection.exec_driver_sql(query, (list(user_ids),)).fetchall()
+        return [event_id for event_id, in rows]
+
+    def getEvents(self, spec):
+        # Past and upcoming events with their start time, for offline snapshots.
+        query = f"""
         select  id,
                 event_type,
                 category,
                 (CASE WHEN price IS NULL THEN true ELSE false END) as price,
                 EXTRACT(HOUR FROM start_date)                            as start_date,
                 EXTRACT(HOUR FROM end_date)                              as end_date,
-                private
-        from event_musical
-        where start_date > now();
+                private,
+                EXTRACT(EPOCH FROM start_date)                           as starts_at
+        from {spec.table};
         """
-        data_frame = pd.read_sql(query, engine)
+        with self.connect() as connection:
+            data_frame = pd.read_sql(query, connection)
         return data_frame
-    
-    def getUpcomingSportEvents(self):
-        engine = create_engine(self.connection_string)
-        query = """
-        select  id,
-                event_type,
-                category,
-                (CASE WHEN price IS NULL THEN true ELSE false END) as price,
+
+    def getUpcomingEvents(self, spec, horizon_days=None, include_private=True):
+        if self.feature_columns:
+            features = """price_missing                                            as price,
+                start_hour                                               as start_date,
+                end_hour                                                 as end_date"""
+        else:
+            features = """(CASE WHEN price IS NULL THEN true ELSE false END) as price,
                 EXTRACT(HOUR FROM start_date)                            as start_date,
-                EXTRACT(HOUR FROM end_date)                              as end_date,
-                private
-        from event_sport
-        where start_date > now();
-        """
-        data_frame = pd.read_sql(query, engine)
-        return data_frame
-    def getUpcomingNatureEvents(self):
-        engine = create_engine(self.connection_string)
-        query = """
+                EXTRACT(HOUR FROM end_date)                              as end_date"""
+        filters = ""
+        if horizon_days:
+            filters += " and start_date <= now() + %(horizon_days)s * interval '1 day'"
+        if not include_private:
+            filters += " and private IS NOT TRUE"
+        query = f"""
         select  id,
                 event_type,
                 category,
-                (CASE WHEN price IS NULL THEN true ELSE false END) as price,
-                EXTRACT(HOUR FROM start_date)                            as start_date,
-                EXTRACT(HOUR FROM end_date)                              as end_date,
+                {features},
                 private
-        from event_nature
-        where start_date > now();
+        from {spec.table}
+        where start_date > now(){filters};
         """
-        data_frame = pd.read_sql(query, engine)
+        with self.connect() as connection:
+            data_frame = pd.read_sql(query, connection, params={"horizon_days": horizon_days})
         return data_frame
-    def getUpcomingStagePlayEvents(self):
-        engine = create_engine(self.connection_string)
-        query = """
-        select  id,
-                event_type,
-                category,
-                (CASE WHEN price IS NULL THEN true ELSE false END) as price,
-                EXTRACT(HOUR FROM start_date)                            as start_date,
-                EXTRACT(HOUR FROM end_date)                              as end_date,
-                private
-        from event_stage_play
-        where start_date > now();
-        """
-        data_frame = pd.read_sql(query, engine)
-        return data_frame
\ No newline at end of file
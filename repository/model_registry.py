@@ -0,0 +1,71 @@
+from util.singleton import singleton
+import hashlib
+import joblib
+import time
+import os
+
+class StoredModel:
+    def __init__(self, model, metadata, version):
+        self.model = model
+        self.metadata = metadata
+        self.version = version
+
+def scope_name(scope):
+    if scope is None:
+        return "global"
+    if isinstance(scope, tuple):
+        ids = "_".join(str(user_id) for user_id in scope)
+        return "group-" + hashlib.blake2b(ids.encode(), digest_size=12).hexdigest()
+    return f"user-{scope}"
+
+@singleton
+class ModelRegistry:
+    def __init__(self):
+        self.directory = os.environ.get('MODEL_DIR', 'models')
+        self.keep_versions = max(1, int(os.environ.get('MODEL_REGISTRY_KEEP_VERSIONS', 2)))
+        # Memory-mapped arrays are shared between worker processes through the page
+        # cache. That holds for the array-backed engines (table, logistic) only:
+        # sklearn's trees copy their node arrays when unpickled, so forests are
+        # shared by loading them before the fork instead (see gunicorn.conf.py).
+        self.mmap_mode = 'r' if os.environ.get('MODEL_REGISTRY_MMAP', 'true').lower() == 'true' else None
+
+    def scopeDirectory(self, event_type, scope):
+        return os.path.join(self.directory, event_type, scope_name(scope))
+
+    def versions(self, event_type, scope):
+        directory = self.scopeDirectory(event_type, scope)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            int(name[1:-len(".joblib")])
+            for name in os.listdir(directory)
+            if name.startswith("v") and name.endswith(".joblib")
+        )
+
+    def save(self, event_type, scope, model, metadata):
+        directory = self.scopeDirectory(event_type, scope)
+        os.makedirs(directory, exist_ok=True)
+        version = time.time_ns()
+        path = os.path.join(directory, f"v{version}.joblib")
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        # Left uncompressed so the arrays can be memory-mapped on load.
+        joblib.dump({"model": model, "metadata": metadata}, temporary_path)
+        os.replace(temporary_path, path)
+
+        for old_version in self.versions(event_type, scope)[:-self.keep_versions]:
+            try:
+                os.remove(os.path.join(directory, f"v{old_version}.joblib"))
+            except FileNotFoundError:
+                pass
+        return version
+
+    def load(self, event_type, scope):
+        versions = self.versions(event_type, scope)
+        if not versions:
+            return None
+        path = os.path.join(self.scopeDirectory(event_type, scope), f"v{versions[-1]}.joblib")
+        try:
+            payload = joblib.load(path, mmap_mode=self.mmap_mode)
+        except FileNotFoundError:
+            return None
+        return StoredModel(payload["model"], payload["metadata"], versions[-1])
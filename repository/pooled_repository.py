@@ -0,0 +1,47 @@
+from contextlib import contextmanager
+import threading
+import time
+
+class PooledRepository:
+    # Connection checkout bookkeeping shared by the SQL-backed repositories.
+    def __init__(self, engine):
+        self.engine = engine
+
+        self.stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    @contextmanager
+    def connect(self):
+        start = time.perf_counter()
+        connection = self.engine.connect()
+        wait = time.perf_counter() - start
+        with self.stats_lock:
+            self.checkouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def getPoolStats(self):
+        pool = self.engine.pool
+        with self.stats_lock:
+            checkouts = self.checkouts
+            wait_total = self.checkout_wait_total
+            wait_max = self.checkout_wait_max
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": checkouts,
+            "checkout_wait_avg": wait_total / checkouts if checkouts else 0.0,
+            "checkout_wait_max": wait_max,
+        }
+
+    def afterFork(self):
+        # Connections inherited from the parent must not be shared across processes.
+        self.engine.dispose(close=False)
@@ -0,0 +1,47 @@
+from service.event_types import FEATURE_COLUMNS, encode
+import numpy as np
+
+RATING_COLUMNS = ("event_type", "user_id", "event_id", "category", "price", "start_date", "end_date", "private", "rate", "cursor")
+
+class RatingsBatch:
+    # Built from the result one partition at a time: each partition is split by
+    # event type and reduced to typed columns (int64 ids and rates, int8 encoded
+    # features) before the next is fetched, so the rows of a large result never
+    # exist as Python objects all at once. Each type's rows are then sorted by
+    # user, making every user's ratings a contiguous slice.
+    def __init__(self, specs, partitions):
+        parts = {spec.name: [] for spec in specs}
+        for rows in partitions:
+            if not rows:
+                continue
+            columns = dict(zip(RATING_COLUMNS, (np.asarray(column, dtype=object) for column in zip(*rows))))
+            for spec in specs:
+                select = np.flatnonzero(columns["event_type"] == spec.name)
+                if len(select) == 0:
+                    continue
+                part = {name: column[select] for name, column in columns.items()}
+                parts[spec.name].append((
+                    encode(spec, part["category"], part["price"], part["start_date"], part["end_date"], part["private"]),
+                    part["rate"].astype(np.int64),
+                    part["user_id"].astype(np.int64),
+                    part["event_id"].astype(np.int64),
+                    # The rate cursor is numeric by default (id) but may be any ordered type.
+                    np.asarray(part["cursor"].tolist()),
+                ))
+
+        # event type -> (features, rates, {user_id: slice}, event_ids, cursors)
+        self.types = {}
+        for event_type, type_parts in parts.items():
+            if type_parts:
+                features, rates, user_ids, event_ids, cursors = (np.concatenate(column) for column in zip(*type_parts))
+            else:
+                features = np.empty((0, len(FEATURE_COLUMNS)), dtype=np.int8)
+                rates, user_ids, event_ids, cursors = (np.empty(0, dtype=np.int64) for _ in range(4))
+            order = np.argsort(user_ids, kind='stable')
+            user_ids = user_ids[order]
+
+            boundaries = np.flatnonzero(user_ids[1:] != user_ids[:-1]) + 1
+            starts = np.concatenate(([0], boundaries)).tolist() if len(order) else []
+            stops = np.concatenate((boundaries, [len(order)])).tolist() if len(order) else []
+            slices = {int(user_ids[start]): slice(start, stop) for start, stop in zip(starts, stops)}
+            self.types[event_type] = (features[order], rates[order], slices, event_ids[order], cursors[order])
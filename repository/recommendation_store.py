@@ -0,0 +1,52 @@
+from util.singleton import singleton
+import json
+import sqlite3
+import threading
+import time
+import os
+
+@singleton
+class RecommendationStore:
+    def __init__(self):
+        self.path = os.environ.get('RECOMMENDATION_STORE_PATH', 'recommendations.sqlite3')
+        self.max_age = float(os.environ.get('RECOMMENDATION_STORE_MAX_AGE_SECONDS', 86400))
+        self.local = threading.local()
+
+    def connect(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            return connection
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS recommendation (
+                event_type  TEXT    NOT NULL,
+                user_id     INTEGER NOT NULL,
+                payload     TEXT    NOT NULL,
+                computed_at REAL    NOT NULL,
+                PRIMARY KEY (event_type, user_id)
+            )
+            """)
+        self.local.connection = connection
+        return connection
+
+    def get(self, event_type, user_id):
+        if not os.path.exists(self.path):
+            return None
+        row = self.connect().execute(
+            "SELECT payload FROM recommendation WHERE event_type = ? AND user_id = ? AND computed_at > ?",
+            (event_type, user_id, time.time() - self.max_age),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def putMany(self, event_type, recommendations):
+        computed_at = time.time()
+        rows = [(event_type, user_id, json.dumps(payload), computed_at) for user_id, payload in recommendations]
+        connection = self.connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO recommendation (event_type, user_id, payload, computed_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
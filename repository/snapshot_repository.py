@@ -0,0 +1,158 @@
+import pandas as pd
+from util.singleton import singleton
+import numpy as np
+import threading
+import json
+import time
+import os
+
+# Arrays written per event type by service.snapshot. Ratings are grouped by user
+# and indexed CSR-style: user_ids[i]'s rows are offsets[i]:offsets[i + 1], in
+# order of the rate cursor (EVENT_RATE_CURSOR_COLUMN) exported with them.
+RATING_ARRAYS = ("user_ids", "offsets", "features", "rates", "event_ids", "cursor")
+EVENT_ARRAYS = ("event_ids", "features", "starts_at")
+
+class Snapshot:
+    def __init__(self, directory, mmap_mode='r'):
+        with open(os.path.join(directory, "metadata.json")) as file:
+            self.metadata = json.load(file)
+        self.ratings = {name: np.load(os.path.join(directory, f"ratings_{name}.npy"), mmap_mode=mmap_mode)
+                        for name in RATING_ARRAYS}
+        self.events = {name: np.load(os.path.join(directory, f"events_{name}.npy"), mmap_mode=mmap_mode)
+                       for name in EVENT_ARRAYS}
+
+    def userRows(self, user_ids):
+        known = self.ratings["user_ids"]
+        user_ids = np.unique(np.asarray(list(user_ids), dtype=np.int64))
+        positions = np.searchsorted(known, user_ids)
+        found = positions < len(known)
+        found[found] = known[positions[found]] == user_ids[found]
+        offsets = self.ratings["offsets"]
+        return {
+            int(user_id): slice(int(offsets[position]), int(offsets[position + 1]))
+            for user_id, position in zip(user_ids[found], positions[found])
+        }
+
+@singleton
+class SnapshotRepository:
+    # Serves the repository queries from a snapshot exported by service.snapshot
+    # instead of the database. The arrays are memory-mapped, so the per-user
+    # training sets are views into the page cache shared by every process. A new
+    # export is picked up when the service restarts.
+    def __init__(self):
+        self.directory = os.environ.get('SNAPSHOT_DIR', 'snapshot')
+        self.lock = threading.Lock()
+        self.snapshots = {}
+
+    def snapshot(self, spec):
+        snapshot = self.snapshots.get(spec.name)
+        if snapshot is None:
+            with self.lock:
+                snapshot = self.snapshots.get(spec.name)
+                if snapshot is None:
+                    snapshot = Snapshot(os.path.join(self.directory, spec.name))
+                    if tuple(snapshot.metadata["categories"]) != tuple(spec.categories):
+                        raise ValueError(f"snapshot of {spec.name} was encoded with other categories, export it again")
+                    self.snapshots[spec.name] = snapshot
+        return snapshot
+
+    def getPoolStats(self):
+        return {
+            "size": 0,
+            "checked_in": 0,
+            "checked_out": 0,
+            "overflow": 0,
+            "checkouts": 0,
+            "checkout_wait_avg": 0.0,
+            "checkout_wait_max": 0.0,
+        }
+
+    def afterFork(self):
+        # Read-only mappings are safe to share with forked processes.
+        pass
+
+    def getRatedUserIds(self, spec):
+        return self.snapshot(spec).ratings["user_ids"].tolist()
+
+    def getEncodedRatesForUsers(self, specs, user_ids, since=None, until=None):
+        # Every user's rows are contiguous and ordered by the rate cursor, so a
+        # since/until window narrows the user's slice without copying.
+        encoded = {}
+        for spec in specs:
+            ratings = self.snapshot(spec).ratings
+            cursor = ratings["cursor"]
+            slices = {}
+            for user_id, rows in self.snapshot(spec).userRows(user_ids).items():
+                start, stop = rows.start, rows.stop
+                if since is not None:
+                    start += int(np.searchsorted(cursor[rows], since, side='right'))
+                if until is not None:
+                    stop = rows.start + int(np.searchsorted(cursor[rows], until, side='right'))
+                if start < stop:
+                    slices[user_id] = slice(start, stop)
+            encoded[spec.name] = (ratings["features"], ratings["rates"], slices, ratings["event_ids"], cursor)
+        return encoded
+
+    def getRatingWatermarks(self, spec, user_ids):
+        cursor = self.snapshot(spec).ratings["cursor"]
+        return {
+            user_id: (rows.stop - rows.start, cursor[rows.stop - 1].item())
+            for user_id, rows in self.snapshot(spec).userRows(user_ids).items()
+            if rows.stop > rows.start
+        }
+
+    def getRatingsVersion(self, spec):
+        cursor = self.snapshot(spec).ratings["cursor"]
+        return len(cursor), cursor.max().item() if len(cursor) else None
+
+    def getEventRatesSample(self, spec, limit=1500):
+        ratings = self.snapshot(spec).ratings
+        rows = np.sort(np.random.default_rng().permutation(len(ratings["rates"]))[:limit])
+        data_frame = decodeFeatures(spec, ratings["features"][rows])
+        data_frame["rate"] = ratings["rates"][rows].astype(np.int64)
+        return data_frame
+
+    def getRatedEventIds(self, spec, user_ids):
+        snapshot = self.snapshot(spec)
+        rows = list(snapshot.userRows(user_ids).values())
+        if not rows:
+            return []
+        rated = np.unique(np.concatenate([snapshot.ratings["event_ids"][r] for r in rows]))
+        events = snapshot.events
+        upcoming = events["event_ids"][events["starts_at"] > time.time()]
+        return rated[np.isin(rated, upcoming)].tolist()
+
+    def getEvents(self, spec):
+        snapshot = self.snapshot(spec)
+        return eventFrame(spec, snapshot, np.ones(len(snapshot.events["event_ids"]), dtype=bool))
+
+    def getUpcomingEvents(self, spec, horizon_days=None, include_private=True):
+        snapshot = self.snapshot(spec)
+        events = snapshot.events
+        now = time.time()
+        selected = events["starts_at"] > now
+        if horizon_days:
+            selected &= events["starts_at"] <= now + horizon_days * 86400
+        if not include_private:
+            selected &= events["features"][:, 4] != 1
+        return eventFrame(spec, snapshot, selected)
+
+def decodeFeatures(spec, features):
+    # Inverse of service.event_types.encode, for callers that take raw columns.
+    features = np.asarray(features)
+    flags = np.array([None, False, True], dtype=object)
+    return pd.DataFrame({
+        "category": np.append(np.asarray(spec.categories, dtype=object), None)[features[:, 0]],
+        "price": flags[features[:, 1] + 1],
+        "start_date": np.where(features[:, 2] < 0, np.nan, features[:, 2]),
+        "end_date": np.where(features[:, 3] < 0, np.nan, features[:, 3]),
+        "private": flags[features[:, 4] + 1],
+    })
+
+def eventFrame(spec, snapshot, selected):
+    events = snapshot.events
+    data_frame = decodeFeatures(spec, events["features"][selected])
+    data_frame.insert(0, "id", events["event_ids"][selected])
+    data_frame.insert(1, "event_type", snapshot.metadata["event_type"])
+    data_frame["starts_at"] = events["starts_at"][selected]
+    return data_frame
@@ -0,0 +1,137 @@
+import pandas as pd
+from sqlalchemy import create_engine
+from repository.pooled_repository import PooledRepository
+from repository.ratings_batch import RatingsBatch
+from util.singleton import singleton
+import json
+import os
+
+# Hours are read from 'YYYY-MM-DD HH:MM:SS' UTC text columns.
+FEATURES = """eb.category,
+                    (CASE WHEN eb.price IS NULL THEN 1 ELSE 0 END)                            as price,
+                    CAST(strftime('%H', eb.start_date) AS INTEGER)                            as start_date,
+                    CAST(strftime('%H', eb.end_date) AS INTEGER)                              as end_date,
+                    eb.private"""
+
+@singleton
+class SqliteEventRepository(PooledRepository):
+    # Local stand-in for the Postgres repository, with the same schema and
+    # results, for load tests and development without a database server. See
+    # service.synthetic for generating a database.
+    def __init__(self):
+        self.path = os.environ.get('SQLITE_DATABASE_PATH', 'events.sqlite3')
+        super().__init__(create_engine(
+            f"sqlite:///{self.path}",
+            connect_args={"check_same_thread": False},
+            pool_size=int(os.environ.get('DATABASE_POOL_SIZE', 5)),
+            max_overflow=int(os.environ.get('DATABASE_POOL_MAX_OVERFLOW', 10)),
+        ))
+        self.rate_cursor = os.environ.get('EVENT_RATE_CURSOR_COLUMN', 'id')
+
+    def getRatedUserIds(self, spec):
+        query = f"""
+                SELECT DISTINCT er.user_id
+                FROM event_rate er
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id;
+                """
+        with self.connect() as connection:
+            data_frame = pd.read_sql(query, connection)
+        return data_frame["user_id"].tolist()
+
+    def getEventRatesForUsers(self, specs, user_ids, since=None, until=None):
+        window = ""
+        if since is not None:
+            window += f" AND er.{self.rate_cursor} > :since"
+        if until is not None:
+            window += f" AND er.{self.rate_cursor} <= :until"
+        query = "\n                UNION ALL\n".join(f"""
+                SELECT '{spec.name}'                                                          as event_type,
+                    er.user_id,
+                    er.event_id,
+                    {FEATURES},
+                    er.rate,
+                    er.{self.rate_cursor}                                                    as cursor
+                FROM event_rate er
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id
+                WHERE er.user_id IN (SELECT value FROM json_each(:user_ids)){window}""" for spec in specs)
+
+        with self.connect() as connection:
+            result = connection.exec_driver_sql(
+                query, {"user_ids": json.dumps(list(user_ids)), "since": since, "until": until})
+            return RatingsBatch(specs, result.partitions(5000))
+
+    def getRatingWatermarks(self, spec, user_ids):
+        query = f"""
+                SELECT er.user_id, count(*) as ratings, max(er.{self.rate_cursor}) as watermark
+                FROM event_rate er
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id
+                WHERE er.user_id IN (SELECT value FROM json_each(?))
+                GROUP BY er.user_id;
+                """
+        with self.connect() as connection:
+            rows = connection.exec_driver_sql(query, (json.dumps(list(user_ids)),)).fetchall()
+        return {user_id: (count, watermark) for user_id, count, watermark in rows}
+
+    def getRatingsVersion(self, spec):
+        # Changes whenever ratings are added or removed; keys cached evaluations.
+        query = f"""
+                SELECT count(*) as ratings, max(er.{self.rate_cursor}) as watermark
+                FROM event_rate er
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id;
+                """
+        with self.connect() as connection:
+            count, watermark = connection.exec_driver_sql(query).fetchone()
+        return count, watermark
+
+    def getEventRatesSample(self, spec, limit=1500):
+        query = f"""
+                SELECT {FEATURES},
+                    er.rate
+                FROM event_rate er
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id
+                ORDER BY random()
+                LIMIT ?;
+                """
+        with self.connect() as connection:
+            data_frame = pd.read_sql(query, connection, params=(limit,))
+        return data_frame
+
+    def getRatedEventIds(self, spec, user_ids):
+        query = f"""
+                SELECT DISTINCT er.event_id
+                FROM event_rate er
+                        INNER JOIN {spec.table} eb ON er.event_type = eb.event_type AND er.event_id = eb.id
+                WHERE er.user_id IN (SELECT value FROM json_each(?)) AND eb.start_date > datetime('now');
+                """
+        with self.connect() as connection:
+            rows = connection.exec_driver_sql(query, (json.dumps(list(user_ids)),)).fetchall()
+        return [event_id for event_id, in rows]
+
+    def getEvents(self, spec):
+        query = f"""
+        select  eb.id,
+                eb.event_type,
+                {FEATURES},
+                CAST(strftime('%s', eb.start_date) AS INTEGER)           as starts_at
+        from {spec.table} eb;
+        """
+        with self.connect() as connection:
+            data_frame = pd.read_sql(query, connection)
+        return data_frame
+
+    def getUpcomingEvents(self, spec, horizon_days=None, include_private=True):
+        filters = ""
+        if horizon_days:
+            filters += " and eb.start_date <= datetime('now', '+' || :horizon_days || ' days')"
+        if not include_private:
+            filters += " and eb.private IS NOT 1"
+        query = f"""
+        select  eb.id,
+                eb.event_type,
+                {FEATURES}
+        from {spec.table} eb
+        where eb.start_date > datetime('now'){filters};
+        """
+        with self.connect() as connection:
+            data_frame = pd.read_sql(query, connection, params={"horizon_days": horizon_days})
+        return data_frame
@@ -0,0 +1,74 @@
+from repository.backends import event_repository
+from service.event_types import EVENT_TYPES, encodeFrame
+from util.singleton import singleton
+from util.timing import timed
+import numpy as np
+import threading
+import time
+import os
+
+class Catalog:
+    def __init__(self, ids, event_types, features):
+        self.ids = ids
+        self.event_types = event_types
+        self.features = features
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.ids)
+
+def load_catalog(spec, horizon_days=None, include_private=True):
+    with timed('catalog'):
+        events = event_repository().getUpcomingEvents(spec, horizon_days, include_private)
+    with timed('encode'):
+        # Trees predict on float32, so converting once here saves a copy per request.
+        features = encodeFrame(spec, events).astype(np.float32)
+    return Catalog(events["id"].to_numpy(), events["event_type"].to_numpy(), features)
+
+@singleton
+class CatalogCache:
+    def __init__(self):
+        self.refresh_interval = float(os.environ.get('CATALOG_REFRESH_SECONDS', 60))
+        # Events further ahead than the horizon are left out of the candidate set;
+        # 0 disables the limit.
+        self.horizon_days = float(os.environ.get('CATALOG_HORIZON_DAYS', 180))
+        # There is no per-user access list for private events, so they are either
+        # offered to everyone or to no one.
+        self.include_private = os.environ.get('CATALOG_INCLUDE_PRIVATE', 'false').lower() == 'true'
+        self.catalogs = {}
+        self.locks = {event_type: threading.Lock() for event_type in EVENT_TYPES}
+
+    def get(self, spec):
+        catalog = self.catalogs.get(spec.name)
+        if catalog is not None and time.monotonic() - catalog.loaded_at < self.refresh_interval:
+            return catalog
+
+        lock = self.locks[spec.name]
+        # While another request reloads an expired catalog, keep serving the old one.
+        if not lock.acquire(blocking=catalog is None):
+            return catalog
+        try:
+            current = self.catalogs.get(spec.name)
+            if current is not catalog:
+                return current
+            catalog = self.load(spec)
+            self.catalogs[spec.name] = catalog
+            return catalog
+        finally:
+            lock.release()
+
+    def load(self, spec):
+        return load_catalog(spec, self.horizon_days, self.include_private)
+
+    def refresh(self, spec):
+        with self.locks[spec.name]:
+            catalog = self.load(spec)
+            self.catalogs[spec.name] = catalog
+            return catalog
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            event_type: {"events": len(catalog), "age_seconds": now - catalog.loaded_at}
+            for event_type, catalog in self.catalogs.items()
+        }
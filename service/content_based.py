@@ -1,175 +1,71 @@
-from sklearn.linear_model import LogisticRegression
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.svm import SVC
-from sklearn.model_selection import train_test_split,cross_val_score,KFold
-from repository.event_repository import EventRepository
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.tree import DecisionTreeClassifier
-import json
-
-def crossValidate():
-    dataset = EventRepository().getMusicalEventRates()
-    dataset["category"] = dataset["category"].map({"Concert": 0, "Festival": 1})
-    dataset["price"] = dataset["price"].map({False: 0, True: 1})
-    dataset["private"] = dataset["private"].map({False: 0, True: 1})
-    y = dataset["rate"]
-    dataset = dataset.drop("rate", axis = 1)
-    X_train, X_test, y_train, y_test = train_test_split(dataset, y, test_size=0.2, random_state=42)
-
-    models = []
-    models.append(('LR', LogisticRegression(max_iter=1500)))
-    models.append(('KNN', KNeighborsClassifier()))
-    models.append(('RF', RandomForestClassifier()))
-    models.append(('DT', DecisionTreeClassifier()))
-    
-    results = dict()
-    for name, model in models:
-        kfold = KFold(n_splits=10,random_state=7, shuffle=True)
-        cv_results = cross_val_score(model, X_train, y_train, cv=kfold, scoring='accuracy')
-        results[name]= (cv_results.mean())
-
-    return results
-
-def predictMusical(dataset):
-    dataset["category"] = dataset["category"].map({"Concert": 0, "Festival": 1})
-    dataset["price"] = dataset["price"].map({False: 0, True: 1})
-    dataset["private"] = dataset["private"].map({False: 0, True: 1})
-    y = dataset["rate"]
-    dataset = dataset.drop("rate", axis = 1)
-
-    X_train, X_test, y_train, y_test = train_test_split(dataset, y, test_size=0.2, random_state=42)
-
-
-    rf =  RandomForestClassifier(n_estimators=100)
-    rf.fit(X_train, y_train)
-    #####
-    pred_events = EventRepository().getUpcomingMusicalEvents()
-    input = pred_events
-
-    input = input.drop("id", axis = 1)
-    input = input.drop("event_type", axis = 1)
-
-    pred_events = pred_events.drop("category", axis = 1)
-    pred_events = pred_events.drop("price", axis = 1)
-    pred_events = pred_events.drop("private", axis = 1)
-    pred_events = pred_events.drop("start_date", axis = 1)
-    pred_events = pred_events.drop("end_date", axis = 1)
-    
-    input["category"] = input["category"].map({"Concert": 0, "Festival": 1})
-    input["price"] = input["price"].map({False: 0, True: 1})
-    input["private"] = input["private"].map({False: 0, True: 1})
-    
-    pred = rf.predict(input).tolist()
-    pred_events['prediction'] = pred
-    pred_events = pred_events.sort_values(by="prediction", ascending=False)
-    json_data = pred_events.to_json(orient='records')
-
-    return json.loads(json_data)
-
-def predictSport(dataset):
-    dataset["category"] = dataset["category"].map({"Football": 0, "Basketball": 1, "Volleyball": 2, "Jogging": 3})
-    dataset["price"] = dataset["price"].map({False: 0, True: 1})
-    dataset["private"] = dataset["private"].map({False: 0, True: 1})
-    y = dataset["rate"]
-    dataset = dataset.drop("rate", axis = 1)
-
-    X_train, X_test, y_train, y_test = train_test_split(dataset, y, test_size=0.2, random_state=42)
-
-
-    rf =  RandomForestClassifier(n_estimators=100)
-    rf.fit(X_train, y_train)
-    #####
-    pred_events = EventRepository().getUpcomingSportEvents()
-    input = pred_events
-
-    input = input.drop("id", axis = 1)
-    input = input.drop("event_type", axis = 1)
-
-    pred_events = pred_events.drop("category", axis = 1)
-    pred_events = pred_events.drop("price", axis = 1)
-    pred_events = pred_events.drop("private", axis = 1)
-    pred_events = pred_events.drop("start_date", axis = 1)
-    pred_events = pred_events.drop("end_date", axis = 1)
-    
-    input["category"] = input["category"].map({"Football": 0, "Basketball": 1, "Volleyball": 2, "Jogging": 3})
-    input["price"] = input["price"].map({False: 0, True: 1})
-    input["private"] = input["private"].map({False: 0, True: 1})
-    
-    pred = rf.predict(input).tolist()
-    pred_events['prediction'] = pred
-    pred_events = pred_events.sort_values(by="prediction", ascending=False)
-    json_data = pred_events.to_json(orient='records')
-
-    return json.loads(json_data)
-
-
-def predictNature(dataset):
-    dataset["category"] = dataset["category"].map({"Camp": 0, "Hiking": 1})
-    dataset["price"] = dataset["price"].map({False: 0, True: 1})
-    dataset["private"] = dataset["private"].map({False: 0, True: 1})
-    y = dataset["rate"]
-    dataset = dataset.drop("rate", axis = 1)
-
-    X_train, X_test, y_train, y_test = train_test_split(dataset, y, test_size=0.2, random_state=42)
-
-
-    rf =  RandomForestClassifier(n_estimators=100)
-    rf.fit(X_train, y_train)
-    #####
-    pred_events = EventRepository().getUpcomingNatureEvents()
-    input = pred_events
-
-    input = input.drop("id", axis = 1)
-    input = input.drop("event_type", axis = 1)
-
-    pred_events = pred_events.drop("category", axis = 1)
-    pred_events = pred_events.drop("price", axis = 1)
-    pred_events = pred_events.drop("private", axis = 1)
-    pred_events = pred_events.drop("start_date", axis = 1)
-    pred_events = pred_events.drop("end_date", axis = 1)
-    
-    input["category"] = input["category"].map({"Camp": 0, "Hiking": 1})
-    input["price"] = input["price"].map({False: 0, True: 1})
-    input["private"] = input["private"].map({False: 0, True: 1})
-    
-    pred = rf.predict(input).tolist()
-    pred_events['prediction'] = pred
-    pred_events = pred_events.sort_values(by="prediction", ascending=False)
-    json_data = pred_events.to_json(orient='records')
-
-    return json.loads(json_data)
-
-def predictStagePlay(dataset):
-    dataset["category"] = dataset["category"].map({"Theatre": 0, "StandUp": 1})
-    dataset["price"] = dataset["price"].map({False: 0, True: 1})
-    dataset["private"] = dataset["private"].map({False: 0, True: 1})
-    y = dataset["rate"]
-    dataset = dataset.drop("rate", axis = 1)
-
-    X_train, X_test, y_train, y_test = train_test_split(dataset, y, test_size=0.2, random_state=42)
-
-    rf =  RandomForestClassifier(n_estimators=100)
-    rf.fit(X_train, y_train)
-    #####
-    pred_events = EventRepository().getUpcomingStagePlayEvents()
-    input = pred_events
-
-    input = input.drop("id", axis = 1)
-    input = input.drop("event_type", axis = 1)
-
-    pred_events = pred_events.drop("category", axis = 1)
-    pred_events = pred_events.drop("price", axis = 1)
-    pred_events = pred_events.drop("private", axis = 1)
-    pred_events = pred_events.drop("start_date", axis = 1)
-    pred_events = pred_events.drop("end_date", axis = 1)
-    
-    input["category"] = input["category"].map({"Theatre": 0, "StandUp": 1})
-    input["price"] = input["price"].map({False: 0, True: 1})
-    input["private"] = input["private"].map({False: 0, True: 1})
-    
-    pred = rf.predict(input).tolist()
-    pred_events['prediction'] = pred
-    pred_events = pred_events.sort_values(by="prediction", ascending=False)
-    json_data = pred_events.to_json(orient='records')
-
-    return json.loads(json_data)
\ No newline at end of file
+from service.model_cache import ModelCache, fingerprint
+from repository.model_registry import ModelRegistry
+from service.training_pool import TrainingPool
+from service.global_models import GlobalModels
+from service.catalog_cache import CatalogCache
+from service.ranking import topIndices
+from service import engines
+from util.timing import timed
+import numpy as np
+import os
+
+EXCLUDE_RATED = os.environ.get('CATALOG_EXCLUDE_RATED', 'true').lower() == 'true'
+
+def fitModel(spec, scope, features, rates, dataset_fingerprint=None):
+    if len(rates) < 2:
+        raise ValueError("not enough ratings to train a model")
+
+    if dataset_fingerprint is None:
+        # A change of engine must not reuse a model trained by another one.
+        dataset_fingerprint = (spec.engine,) + fingerprint(features, rates)
+    model = ModelCache().get(spec.name, scope, dataset_fingerprint)
+    if model is not None:
+        return model
+
+    if not ModelCache().contains(spec.name, scope):
+        # First use of this scope in this process: load whatever an earlier
+        # process persisted, even if the ratings have moved on since.
+        stored = ModelRegistry().load(spec.name, scope)
+        if stored is not None:
+            ModelCache().put(spec.name, scope, stored.metadata["fingerprint"], stored.model)
+            if stored.metadata["fingerprint"] == dataset_fingerprint:
+                return stored.model
+
+    # Serve the previous model, or the global one for a new scope, while the refit
+    # runs in the background; only when neither exists does the request wait.
+    future = TrainingPool().submit(spec, scope, dataset_fingerprint, features, rates)
+    model = ModelCache().getStale(spec.name, scope)
+    if model is None:
+        model = GlobalModels().peek(spec)
+    if model is not None:
+        return model
+    with timed('fit_wait'):
+        return future.result()
+
+def rankCatalog(model, spec, limit=None, offset=0, rated=None):
+    catalog = CatalogCache().get(spec)
+    if len(catalog) == 0:
+        return []
+    return serializeRanking(catalog, scoreCatalog(model, catalog), limit, offset, rated)
+
+def scoreCatalog(model, catalog):
+    with timed('predict'):
+        return engines.expectedRates(model, catalog.features)
+
+def serializeRanking(catalog, scores, limit=None, offset=0, rated=None):
+    with timed('serialize'):
+        # The catalog is shared, so events the user already rated are masked out
+        # of the ranking rather than filtered when it is loaded.
+        exclude = np.isin(catalog.ids, rated) if EXCLUDE_RATED and rated is not None and len(rated) else None
+        order = topIndices(scores, offset, limit, exclude)
+        result = [
+            {"id": id, "event_type": event_type, "prediction": prediction}
+            for id, event_type, prediction in zip(
+                catalog.ids[order].tolist(), catalog.event_types[order].tolist(), scores[order].tolist())
+        ]
+
+    return result
+
+def predictEvents(spec, features, rates, scope, limit=None, offset=0, rated=None):
+    model = fitModel(spec, scope, features, rates)
+    return rankCatalog(model, spec, limit, offset, rated)
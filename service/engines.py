@@ -0,0 +1,167 @@
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder
+import numpy as np
+import copy
+
+# Cardinality of every feature column after shifting the -1 "missing" code to 0:
+# category, price, start hour, end hour, private.
+FLAG_SIZE = 3
+HOUR_SIZE = 25
+
+class LookupTableClassifier(ClassifierMixin, BaseEstimator):
+    # The feature space (category x price x start hour x end hour x private) is small
+    # enough to tabulate. Each cell's rate distribution is smoothed towards its
+    # (category, price, private) cell, which is smoothed towards the overall
+    # distribution, and the expected rate of every cell is precomputed so a whole
+    # catalog is scored with one gather.
+    def __init__(self, n_categories=4, smoothing=2.0):
+        self.n_categories = n_categories
+        self.smoothing = smoothing
+
+    def shape(self):
+        return (self.n_categories + 1, FLAG_SIZE, HOUR_SIZE, HOUR_SIZE, FLAG_SIZE)
+
+    def cells(self, X):
+        X = np.asarray(X).astype(np.int64) + 1
+        np.clip(X, 0, np.array(self.shape()) - 1, out=X)
+        return np.ravel_multi_index(tuple(X.T), self.shape())
+
+    def coarseCells(self, X):
+        X = np.asarray(X).astype(np.int64) + 1
+        np.clip(X, 0, np.array(self.shape()) - 1, out=X)
+        return np.ravel_multi_index((X[:, 0], X[:, 1], X[:, 4]), (self.n_categories + 1, FLAG_SIZE, FLAG_SIZE))
+
+    def fit(self, X, y):
+        y = np.asarray(y)
+        self.classes_, labels = np.unique(y, return_inverse=True)
+        cells = self.cells(X)
+        coarse_cells = self.coarseCells(X)
+
+        self.cell_ids_, cell_index = np.unique(cells, return_inverse=True)
+        self.cell_counts_ = np.zeros((len(self.cell_ids_), len(self.classes_)))
+        np.add.at(self.cell_counts_, (cell_index, labels), 1)
+        self.coarse_counts_ = np.zeros(((self.n_categories + 1) * FLAG_SIZE * FLAG_SIZE, len(self.classes_)))
+        np.add.at(self.coarse_counts_, (coarse_cells, labels), 1)
+        self.buildTable()
+        return self
+
+    def partial_fit(self, X, y):
+        if not hasattr(self, 'classes_'):
+            return self.fit(X, y)
+
+        classes = np.union1d(self.classes_, y)
+        if len(classes) != len(self.classes_):
+            columns = np.searchsorted(classes, self.classes_)
+            for name in ('cell_counts_', 'coarse_counts_'):
+                counts = getattr(self, name)
+                expanded = np.zeros((len(counts), len(classes)))
+                expanded[:, columns] = counts
+                setattr(self, name, expanded)
+            self.classes_ = classes
+        labels = np.searchsorted(self.classes_, y)
+
+        cells = self.cells(X)
+        cell_ids = np.union1d(self.cell_ids_, cells)
+        if len(cell_ids) != len(self.cell_ids_):
+            expanded = np.zeros((len(cell_ids), len(self.classes_)))
+            expanded[np.searchsorted(cell_ids, self.cell_ids_)] = self.cell_counts_
+            self.cell_ids_, self.cell_counts_ = cell_ids, expanded
+        np.add.at(self.cell_counts_, (np.searchsorted(self.cell_ids_, cells), labels), 1)
+        np.add.at(self.coarse_counts_, (self.coarseCells(X), labels), 1)
+        self.buildTable()
+        return self
+
+    def buildTable(self):
+        class_counts = self.coarse_counts_.sum(axis=0)
+        self.prior_ = class_counts / class_counts.sum()
+        self.coarse_proba_ = self.smooth(self.coarse_counts_, self.prior_)
+
+        values = self.classes_.astype(np.float64)
+        # Cells never seen in training fall back to their coarse cell's expected rate.
+        coarse_rates = (self.coarse_proba_ @ values).reshape(self.n_categories + 1, FLAG_SIZE, FLAG_SIZE)
+        table = np.array(np.broadcast_to(coarse_rates[:, :, None, None, :], self.shape())).ravel()
+        coarse_of_cells = self.coarseCells(np.column_stack(np.unravel_index(self.cell_ids_, self.shape())) - 1)
+        table[self.cell_ids_] = self.smooth(self.cell_counts_, self.coarse_proba_[coarse_of_cells]) @ values
+        self.table_ = table
+
+    def smooth(self, counts, prior):
+        return (counts + self.smoothing * prior) / (counts.sum(axis=1, keepdims=True) + self.smoothing)
+
+    def predict_proba(self, X):
+        cells = self.cells(X)
+        proba = self.coarse_proba_[self.coarseCells(X)]
+        position = np.minimum(np.searchsorted(self.cell_ids_, cells), len(self.cell_ids_) - 1)
+        seen = self.cell_ids_[position] == cells
+        proba[seen] = self.smooth(self.cell_counts_[position[seen]], proba[seen])
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def expectedRates(self, X):
+        return self.table_[self.cells(X)]
+
+def forest(spec):
+    return RandomForestClassifier(n_estimators=100)
+
+def logistic(spec):
+    return make_pipeline(OneHotEncoder(handle_unknown='ignore'), LogisticRegression(max_iter=1000))
+
+def table(spec):
+    return LookupTableClassifier(n_categories=len(spec.categories))
+
+ENGINES = {
+    'forest': forest,
+    'logistic': logistic,
+    'table': table,
+}
+
+def makeModel(spec, rates=None):
+    if spec.engine not in ENGINES:
+        raise ValueError(f"unknown scoring engine {spec.engine!r} for {spec.name}")
+    if spec.engine == 'logistic' and rates is not None and len(np.unique(rates)) < 2:
+        # LogisticRegression cannot fit a single class, as when a user rates every
+        # event the same; the table then predicts that rate.
+        return table(spec)
+    return ENGINES[spec.engine](spec)
+
+def updateModel(model, features, rates, total_rows, max_trees):
+    # Folds newly arrived ratings into a copy of a trained model, or returns None
+    # when the engine cannot be updated and has to be refitted.
+    if isinstance(model, LookupTableClassifier):
+        return copy.deepcopy(model).partial_fit(features, rates)
+
+    if isinstance(model, RandomForestClassifier):
+        # Added trees are fitted on the new rows only; their share of the forest
+        # follows the share of new rows. A few new rows rarely cover every class,
+        # so each missing class gets a zero-weight row: the added trees then keep
+        # the stored class set and their probabilities line up with the old trees'.
+        # A class the model has never seen needs a full refit. The added trees see
+        # every row instead of a bootstrap sample: a sample that misses all the
+        # real rows would leave a tree with zero weight and all-zero probabilities.
+        if len(np.setdiff1d(rates, model.classes_)):
+            return None
+        added = max(1, int(round(len(model.estimators_) * len(rates) / max(1, total_rows - len(rates)))))
+        if len(model.estimators_) + added > max_trees:
+            return None
+        missing = np.setdiff1d(model.classes_, rates)
+        features = np.concatenate((features, np.repeat(features[:1], len(missing), axis=0)))
+        weights = np.concatenate((np.ones(len(rates)), np.zeros(len(missing))))
+        rates = np.concatenate((rates, missing))
+
+        model = copy.deepcopy(model)
+        bootstrap = model.bootstrap
+        model.set_params(warm_start=True, bootstrap=False, n_estimators=len(model.estimators_) + added)
+        model.fit(features, rates, sample_weight=weights)
+        model.set_params(bootstrap=bootstrap)
+        return model
+
+    return None
+
+def expectedRates(model, features):
+    if hasattr(model, 'expectedRates'):
+        return model.expectedRates(features)
+    return model.predict_proba(features) @ model.classes_.astype(np.float64)
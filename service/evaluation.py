@@ -0,0 +1,183 @@
+from sklearn.model_selection import KFold
+from sklearn.metrics import accuracy_score, ndcg_score
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+from joblib import Parallel, delayed
+from repository.backends import event_repository
+from service.event_types import EVENT_TYPES, encodeFrame
+from service.engines import ENGINES, expectedRates
+import numpy as np
+import argparse
+import threading
+import pickle
+import json
+import time
+import os
+
+# Evaluated next to the serving engines for comparison only.
+BASELINES = {
+    'knn': lambda spec: KNeighborsClassifier(),
+    'tree': lambda spec: DecisionTreeClassifier(),
+}
+
+CANDIDATES = dict(ENGINES, **BASELINES)
+
+BENCHMARK_ROWS = 10000
+
+# Benchmarks started by the endpoint run inside a serving worker, so they use few
+# processes; the command line defaults to every CPU.
+BACKGROUND_N_JOBS = int(os.environ.get('EVALUATION_N_JOBS', 1))
+
+def run_fold(spec, engine, features, rates, train, test):
+    model = CANDIDATES[engine](spec)
+    start = time.perf_counter()
+    model.fit(features[train], rates[train])
+    fit_seconds = time.perf_counter() - start
+
+    # Test folds are too small to time reliably, so prediction is timed on the
+    # fold repeated up to a catalog-sized matrix.
+    benchmark = np.resize(features[test], (BENCHMARK_ROWS, features.shape[1])).astype(np.float32)
+    start = time.perf_counter()
+    expectedRates(model, benchmark)
+    predict_seconds = time.perf_counter() - start
+
+    scores = expectedRates(model, features[test])
+    return {
+        "fit_seconds": fit_seconds,
+        "predict_ms_per_1k": predict_seconds * 1000 * 1000 / BENCHMARK_ROWS,
+        "model_bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        "accuracy": accuracy_score(rates[test], model.predict(features[test])),
+        "ndcg": ndcg_score([rates[test]], [scores]) if len(test) > 1 else 1.0,
+    }
+
+def evaluate(spec, features, rates, engines, folds, n_jobs):
+    splits = list(KFold(n_splits=folds, random_state=7, shuffle=True).split(features))
+    jobs = [(engine, train, test) for engine in engines for train, test in splits]
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(run_fold)(spec, engine, features, rates, train, test) for engine, train, test in jobs
+    )
+
+    report = {}
+    for engine in engines:
+        fold_results = [result for (name, _, _), result in zip(jobs, results) if name == engine]
+        report[engine] = {metric: float(np.mean([result[metric] for result in fold_results])) for metric in fold_results[0]}
+    return report
+
+class EvaluationCache:
+    def __init__(self):
+        self.directory = os.environ.get('EVALUATION_DIR', 'evaluation')
+
+    def path(self, event_type, snapshot):
+        return os.path.join(self.directory, f"{event_type}-{snapshot}.json")
+
+    def get(self, event_type, snapshot):
+        try:
+            with open(self.path(event_type, snapshot)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def put(self, event_type, snapshot, report):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = f"{self.path(event_type, snapshot)}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(report, file)
+        os.replace(temporary_path, self.path(event_type, snapshot))
+
+    def latest(self, event_type):
+        if not os.path.isdir(self.directory):
+            return None
+        paths = [
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.startswith(f"{event_type}-") and name.endswith(".json")
+        ]
+        if not paths:
+            return None
+        with open(max(paths, key=os.path.getmtime)) as file:
+            return json.load(file)
+
+def benchmark(event_types, engines=None, folds=10, n_jobs=-1, sample_size=5000):
+    engines = engines or list(CANDIDATES)
+    cache = EvaluationCache()
+    reports = {}
+    for event_type in event_types:
+        spec = EVENT_TYPES[event_type]
+        # The sample is random, so the cache is keyed on the ratings it is drawn
+        # from rather than on the sample itself.
+        version = ratings_version(spec)
+        snapshot = f"{version}-{sample_size}-{folds}-{'_'.join(sorted(engines))}"
+
+        report = cache.get(event_type, snapshot)
+        if report is None:
+            dataset = event_repository().getEventRatesSample(spec, sample_size)
+            features = encodeFrame(spec, dataset)
+            rates = dataset["rate"].to_numpy()
+            report = {
+                "snapshot": version,
+                "rows": len(rates),
+                "folds": folds,
+                "computed_at": time.time(),
+                "engines": evaluate(spec, features, rates, engines, folds, n_jobs),
+            }
+            cache.put(event_type, snapshot, report)
+        reports[event_type] = report
+    return reports
+
+def ratings_version(spec):
+    ratings, watermark = event_repository().getRatingsVersion(spec)
+    return f"{ratings}-{watermark}"
+
+benchmark_lock = threading.Lock()
+
+def benchmarkInBackground(event_types):
+    # At most one benchmark per process; it is far too slow for a request thread.
+    if not benchmark_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            benchmark(event_types, n_jobs=BACKGROUND_N_JOBS)
+        finally:
+            benchmark_lock.release()
+    threading.Thread(target=run, name="benchmark", daemon=True).start()
+
+def latestReport(refresh=False):
+    # The latest report per event type, plus the types being benchmarked because
+    # they have no report or their ratings changed since; those keep serving the
+    # outdated report until the new one is written.
+    cache = EvaluationCache()
+    reports = {} if refresh else {event_type: cache.latest(event_type) for event_type in EVENT_TYPES}
+    pending = [event_type for event_type, spec in EVENT_TYPES.items() if not current(reports.get(event_type), spec)]
+    if pending:
+        benchmarkInBackground(pending)
+    return {event_type: report for event_type, report in reports.items() if report is not None}, pending
+
+def current(report, spec):
+    if report is None:
+        return False
+    try:
+        return report.get("snapshot") == ratings_version(spec)
+    except Exception:
+        # Without the database the cached report is the best there is.
+        return True
+
+def print_report(reports):
+    print(f"{'type':<10}{'engine':<10}{'fit s':>9}{'ms/1k':>9}{'bytes':>11}{'accuracy':>10}{'ndcg':>8}")
+    for event_type, report in reports.items():
+        for engine, metrics in report["engines"].items():
+            print(f"{event_type:<10}{engine:<10}{metrics['fit_seconds']:>9.3f}{metrics['predict_ms_per_1k']:>9.3f}"
+                  f"{metrics['model_bytes']:>11.0f}{metrics['accuracy']:>10.3f}{metrics['ndcg']:>8.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validate scoring engines on accuracy, ranking quality and cost.")
+    parser.add_argument('--event-type', action='append', choices=sorted(EVENT_TYPES), dest='event_types')
+    parser.add_argument('--engine', action='append', choices=sorted(CANDIDATES), dest='engines')
+    parser.add_argument('--folds', type=int, default=10)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--sample-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    print_report(benchmark(args.event_types or list(EVENT_TYPES), args.engines, args.folds, args.n_jobs, args.sample_size))
+
+if __name__ == '__main__':
+    main()
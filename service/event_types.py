@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import os
+
+FEATURE_COLUMNS = ("category", "price", "start_date", "end_date", "private")
+
+class EventTypeSpec:
+    def __init__(self, name, table, categories):
+        self.name = name
+        self.table = table
+        self.categories = categories
+        self.engine = os.environ.get(f'SCORING_ENGINE_{name.upper()}', os.environ.get('SCORING_ENGINE', 'forest'))
+
+EVENT_TYPES = {spec.name: spec for spec in (
+    EventTypeSpec('Musical', 'event_musical', ("Concert", "Festival")),
+    EventTypeSpec('Sport', 'event_sport', ("Football", "Basketball", "Volleyball", "Jogging")),
+    EventTypeSpec('Nature', 'event_nature', ("Camp", "Hiking")),
+    EventTypeSpec('StagePlay', 'event_stage_play', ("Theatre", "StandUp")),
+)}
+
+# Every feature is a small integer, so rows are encoded as int8 with -1 standing in
+# for missing values and categories outside the vocabulary.
+def encode(spec, category, price, start_date, end_date, private):
+    features = np.empty((len(category), len(FEATURE_COLUMNS)), dtype=np.int8)
+    features[:, 0] = pd.Categorical(category, categories=spec.categories).codes
+    features[:, 1] = encodeFlag(price)
+    features[:, 2] = encodeHour(start_date)
+    features[:, 3] = encodeHour(end_date)
+    features[:, 4] = encodeFlag(private)
+    return features
+
+def encodeFrame(spec, frame):
+    return encode(spec, frame["category"], frame["price"], frame["start_date"], frame["end_date"], frame["private"])
+
+def encodeFlag(values):
+    return pd.array(values, dtype="boolean").to_numpy(dtype=np.int8, na_value=-1)
+
+def encodeHour(values):
+    return pd.to_numeric(pd.Series(values)).to_numpy(dtype=np.float64, na_value=-1).astype(np.int8)
@@ -0,0 +1,84 @@
+from repository.backends import event_repository
+from repository.model_registry import ModelRegistry
+from service.event_types import EVENT_TYPES, encodeFrame
+from service.training_pool import TrainingPool
+from util.singleton import singleton
+from util.timing import timed
+import threading
+import time
+import os
+
+class GlobalModel:
+    def __init__(self, model, built_at):
+        self.model = model
+        self.built_at = built_at
+
+@singleton
+class GlobalModels:
+    def __init__(self):
+        self.refresh_interval = float(os.environ.get('GLOBAL_MODEL_REFRESH_SECONDS', 6 * 3600))
+        self.sample_size = int(os.environ.get('GLOBAL_MODEL_SAMPLE_SIZE', 1500))
+        self.models = {}
+        self.locks = {event_type: threading.Lock() for event_type in EVENT_TYPES}
+
+    def get(self, spec):
+        entry = self.peekEntry(spec)
+        if entry is None:
+            with self.locks[spec.name]:
+                entry = self.models.get(spec.name) or self.build(spec)
+        elif time.time() - entry.built_at > self.refresh_interval:
+            self.rebuildInBackground(spec)
+        return entry.model
+
+    def peek(self, spec):
+        # The global model if one is in memory or on disk, without training one.
+        entry = self.peekEntry(spec)
+        return None if entry is None else entry.model
+
+    def peekEntry(self, spec):
+        entry = self.models.get(spec.name)
+        if entry is None:
+            stored = ModelRegistry().load(spec.name, None)
+            if stored is not None and stored.metadata.get("engine") == spec.engine:
+                entry = GlobalModel(stored.model, stored.metadata["built_at"])
+                self.models[spec.name] = entry
+        return entry
+
+    def warmUp(self):
+        for spec in EVENT_TYPES.values():
+            self.get(spec)
+
+    def rebuildInBackground(self, spec):
+        lock = self.locks[spec.name]
+        if not lock.acquire(blocking=False):
+            return
+
+        def rebuild():
+            try:
+                self.build(spec)
+            finally:
+                lock.release()
+        threading.Thread(target=rebuild, name=f"global-model-{spec.name}", daemon=True).start()
+
+    def build(self, spec):
+        with timed('ratings'):
+            dataset = event_repository().getEventRatesSample(spec, self.sample_size)
+        features = encodeFrame(spec, dataset)
+        rates = dataset["rate"].to_numpy()
+        if len(rates) < 2:
+            # Raised before training, so a rebuild keeps serving the previous model.
+            raise ValueError(f"not enough ratings of {spec.name} to train a global model: {len(rates)} sampled")
+        with timed('fit'):
+            model = TrainingPool().train(spec, features, rates).result()
+
+        entry = GlobalModel(model, time.time())
+        ModelRegistry().save(spec.name, None, model, {"built_at": entry.built_at, "engine": spec.engine})
+        self.models[spec.name] = entry
+        return entry
+
+    def stats(self):
+        now = time.time()
+        return {
+            event_type: {"age_seconds": now - entry.built_at}
+            for event_type, entry in self.models.items()
+        }
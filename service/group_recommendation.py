@@ -1,39 +1,81 @@
-from repository.event_repository import EventRepository
-from service.content_based import predictSport, predictMusical, predictNature, predictStagePlay
+from collections import OrderedDict
+from service.content_based import predictEvents, rankCatalog, fitModel, scoreCatalog, serializeRanking
+from service.catalog_cache import CatalogCache
+from service.global_models import GlobalModels
+from service.event_types import EVENT_TYPES
+from service.ratings import loadRatings, loadRatedEvents
+from util.timing import timed
+import numpy as np
+import threading
+import os
 
-def make_group_recommendation(event_type, user_ids):
-    try:
-        if event_type == 'Sport':
-            dataset = EventRepository().getSportEventRatesUser(user_ids)
-            return predictSport(dataset=dataset)
-    except:
-        if event_type == 'Sport':
-            dataset = EventRepository().getSportEventRates()
-            return predictSport(dataset=dataset)
-        
-    try:
-        if event_type == 'Musical':
-            dataset = EventRepository().getMusicalEventRatesUser(user_ids)
-            return predictMusical(dataset=dataset)
-    except:
-        if event_type == 'Musical':
-            dataset = EventRepository().getMusicalEventRates()
-            return predictMusical(dataset=dataset)
-    
+AGGREGATIONS = {
+    'average': lambda scores: scores.mean(axis=0),
+    'least_misery': lambda scores: scores.min(axis=0),
+    'most_pleasure': lambda scores: scores.max(axis=0),
+}
+
+GROUP_STRATEGIES = sorted(AGGREGATIONS) + ['pooled']
+
+class MemberScores:
+    # Expected rates of one member's model over one catalog, reused by every group
+    # the member appears in until either the model or the catalog changes.
+    def __init__(self):
+        self.max_entries = int(os.environ.get('GROUP_SCORE_CACHE_ENTRIES', 5000))
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, spec, user_id, model, catalog):
+        key = (spec.name, user_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is model and entry[1] is catalog:
+                self.entries.move_to_end(key)
+                return entry[2]
+
+        scores = scoreCatalog(model, catalog)
+        with self.lock:
+            self.entries[key] = (model, catalog, scores)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return scores
+
+member_scores = MemberScores()
+
+def member_model(spec, user_id, ratings):
+    features, rates = ratings.forUser(user_id)
     try:
-        if event_type == 'Nature':
-            dataset = EventRepository().getNatureEventRatesUser(user_ids)
-            return predictNature(dataset=dataset)
-    except:
-        if event_type == 'Nature':
-            dataset = EventRepository().getNatureEventRates()
-            return predictNature(dataset=dataset)
-    
+        return fitModel(spec, user_id, features, rates)
+    except ValueError:
+        return GlobalModels().get(spec)
+
+def make_group_recommendation(event_type, user_ids, limit=None, offset=0, strategy='average'):
+    spec = EVENT_TYPES[event_type]
+    user_ids = sorted(set(user_ids))
     try:
-        if event_type == 'StagePlay':
-            dataset = EventRepository().getStagePlayEventRatesUser(user_ids)
-            return predictStagePlay(dataset=dataset)
-    except:
-        if event_type == 'StagePlay':
-            dataset = EventRepository().getStagePlayEventRates()
-            return predictStagePlay(dataset=dataset)
\ No newline at end of file
+        ratings = loadRatings([spec], user_ids)[spec.name]
+    except Exception:
+        return rankCatalog(GlobalModels().get(spec), spec, limit, offset, loadRatedEvents(spec, user_ids))
+    # An event any member has already rated is dropped for the whole group.
+    rated = ratings.ratedEvents(user_ids)
+
+    if strategy == 'pooled':
+        try:
+            features, rates = ratings.forUsers(user_ids)
+            return predictEvents(spec, features, rates, scope=tuple(user_ids), limit=limit, offset=offset,
+                                 rated=rated)
+        except Exception:
+            return rankCatalog(GlobalModels().get(spec), spec, limit, offset, rated)
+
+    catalog = CatalogCache().get(spec)
+    if len(catalog) == 0 or not user_ids:
+        return rankCatalog(GlobalModels().get(spec), spec, limit, offset, rated)
+
+    scores = np.vstack([
+        member_scores.get(spec, user_id, member_model(spec, user_id, ratings), catalog)
+        for user_id in user_ids
+    ])
+    with timed('aggregate'):
+        group_scores = AGGREGATIONS[strategy](scores)
+    return serializeRanking(catalog, group_scores, limit, offset, rated)
@@ -0,0 +1,60 @@
+from repository.backends import event_repository
+from repository.model_registry import ModelRegistry
+from service.content_based import fitModel
+from service.model_cache import ModelCache
+from service.engines import updateModel
+from service.ratings import loadRatings
+from util.timing import timed
+import os
+
+MAX_DRIFT = float(os.environ.get('INCREMENTAL_MAX_DRIFT', 0.25))
+MAX_TREES = int(os.environ.get('INCREMENTAL_MAX_TREES', 200))
+
+def enabled():
+    return os.environ.get('INCREMENTAL_TRAINING', 'false').lower() == 'true'
+
+def incremental_fingerprint(spec, count, watermark):
+    return ('incremental', spec.engine, count, watermark)
+
+def previous_state(spec, user_id):
+    entry = ModelCache().getEntry(spec.name, user_id)
+    if entry is not None:
+        return entry.fingerprint, entry.model
+    stored = ModelRegistry().load(spec.name, user_id)
+    if stored is not None:
+        return stored.metadata["fingerprint"], stored.model
+    return None, None
+
+def user_model(spec, user_id):
+    # Keeps a user's model current by folding in only the ratings above the
+    # high-water mark recorded with it. A full refit happens when the model was
+    # not built incrementally, rows were changed or deleted under the mark, the
+    # new rows exceed INCREMENTAL_MAX_DRIFT of the total, or the engine cannot
+    # be updated in place.
+    with timed('ratings'):
+        watermark = event_repository().getRatingWatermarks(spec, [user_id]).get(user_id)
+    if watermark is None or watermark[0] < 2:
+        raise ValueError("not enough ratings to train a model")
+    count, high_water_mark = watermark
+    current = incremental_fingerprint(spec, count, high_water_mark)
+
+    model = ModelCache().get(spec.name, user_id, current)
+    if model is not None:
+        return model
+
+    previous, model = previous_state(spec, user_id)
+    if previous is not None and previous[:2] == current[:2]:
+        previous_count, previous_mark = previous[2:]
+        if previous_count < count and (count - previous_count) / count <= MAX_DRIFT:
+            features, rates = loadRatings([spec], [user_id], since=previous_mark, until=high_water_mark)[spec.name] \
+                .forUser(user_id)
+            if previous_count + len(rates) == count:
+                with timed('fit'):
+                    updated = updateModel(model, features, rates, count, MAX_TREES)
+                if updated is not None:
+                    ModelCache().put(spec.name, user_id, current, updated)
+                    ModelRegistry().save(spec.name, user_id, updated, {"fingerprint": current})
+                    return updated
+
+    features, rates = loadRatings([spec], [user_id], until=high_water_mark)[spec.name].forUser(user_id)
+    return fitModel(spec, user_id, features, rates, current)
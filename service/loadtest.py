@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from repository.backends import event_repository
+from service.event_types import EVENT_TYPES
+from util.timing import addObserver
+import urllib.request
+import urllib.error
+import numpy as np
+import argparse
+import random
+import time
+
+ROUTES = ('single', 'group', 'cross-validation')
+
+stage_timings = defaultdict(list)
+
+def record_timing(stage, elapsed):
+    stage_timings[stage].append(elapsed)
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        route, weight = part.split('=')
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"unknown route {route!r}, expected one of {', '.join(ROUTES)}")
+        mix[route] = float(weight)
+    return mix
+
+def make_paths(rng, users, mix, group_size, limit, count):
+    routes = list(mix)
+    event_types = [event_type for event_type in users if users[event_type]]
+    paths = []
+    for route in rng.choices(routes, [mix[route] for route in routes], k=count):
+        event_type = rng.choice(event_types)
+        if route == 'single':
+            path = f"/events/{event_type}/predict/rate/{rng.choice(users[event_type])}?limit={limit}"
+        elif route == 'group':
+            members = rng.sample(users[event_type], min(group_size, len(users[event_type])))
+            path = f"/events/{event_type}/predict/rate?limit={limit}&" + "&".join(f"users={user_id}" for user_id in members)
+        else:
+            path = "/cross-validation"
+        paths.append((route, path))
+    return paths
+
+def client_request(url):
+    if url is None:
+        # In-process: the app, its caches and the timing hook live in this process.
+        # Warm up the way gunicorn does before it starts serving.
+        from controller.recommendation_controller import app, warm_up
+        warm_up()
+        client = app.test_client()
+        return lambda path: client.get(path).status_code
+
+    def request(path):
+        try:
+            with urllib.request.urlopen(url.rstrip('/') + path) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+    return request
+
+def run(request, paths, concurrency):
+    def timed_request(route_path):
+        route, path = route_path
+        start = time.perf_counter()
+        status = request(path)
+        return route, status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed_request, paths))
+    return results, time.perf_counter() - start
+
+def load_test(requests, concurrency, mix, group_size=4, limit=20, url=None, seed=0):
+    rng = random.Random(seed)
+    users = {event_type: sorted(event_repository().getRatedUserIds(spec)) for event_type, spec in EVENT_TYPES.items()}
+    request = client_request(url)
+    if url is None:
+        addObserver(record_timing)
+
+    # One untimed pass per route. The cross-validation report is computed in the
+    # background, so wait until it is served before timing starts.
+    for route in mix:
+        for _, path in make_paths(rng, users, {route: 1}, group_size, limit, 1):
+            while request(path) == 202:
+                time.sleep(1)
+    stage_timings.clear()
+
+    return run(request, make_paths(rng, users, mix, group_size, limit, requests), concurrency)
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    return np.percentile(values, 50), np.percentile(values, 95), np.percentile(values, 99)
+
+def print_report(results, elapsed, timings):
+    print(f"{'route':<18}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    by_route = defaultdict(list)
+    for route, status, latency in results:
+        by_route[route].append((status, latency))
+    for route, rows in sorted(by_route.items()) + [("total", [(status, latency) for _, status, latency in results])]:
+        errors = sum(1 for status, _ in rows if status != 200)
+        p50, p95, p99 = percentiles([latency for _, latency in rows])
+        print(f"{route:<18}{len(rows):>9}{errors:>8}{len(rows) / elapsed:>9.1f}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+
+    if timings:
+        print()
+        print(f"{'stage':<18}{'count':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, values in sorted(timings.items()):
+            p50, p95, p99 = percentiles(values)
+            print(f"{stage:<18}{len(values):>9}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the recommendation routes at a fixed concurrency and report "
+                                                 "throughput and latency percentiles per route and pipeline stage.")
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('single=70,group=25,cross-validation=5'),
+                        help="relative weight of each route, e.g. single=70,group=25,cross-validation=5")
+    parser.add_argument('--group-size', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--url', help="base URL of a running server; by default the app is driven in-process")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results, elapsed = load_test(args.requests, args.concurrency, args.mix, args.group_size, args.limit,
+                                 args.url, args.seed)
+    print_report(results, elapsed, dict(stage_timings))
+
+if __name__ == '__main__':
+    main()
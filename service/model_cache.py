@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from util.singleton import singleton
+import numpy as np
+import hashlib
+import pickle
+import threading
+import time
+import os
+
+def fingerprint(features, rates):
+    # Row order is randomised by the ratings queries, so each encoded row is packed
+    # into one integer and the sorted rows are hashed instead of the sequence.
+    packed = np.asarray(rates, dtype=np.int64) << (8 * features.shape[1])
+    for column in range(features.shape[1]):
+        packed |= (features[:, column].astype(np.int64) + 1) << (8 * column)
+    digest = hashlib.blake2b(np.sort(packed).tobytes(), digest_size=16).hexdigest()
+    return (len(packed), digest)
+
+class CacheEntry:
+    def __init__(self, fingerprint, model, size):
+        self.fingerprint = fingerprint
+        self.model = model
+        self.size = size
+        self.stored_at = time.monotonic()
+
+@singleton
+class ModelCache:
+    def __init__(self):
+        self.max_entries = int(os.environ.get('MODEL_CACHE_MAX_ENTRIES', 1000))
+        self.max_bytes = int(os.environ.get('MODEL_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+        self.ttl = float(os.environ.get('MODEL_CACHE_TTL_SECONDS', 3600))
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def get(self, event_type, scope, fingerprint):
+        key = (event_type, scope)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.fingerprint != fingerprint or self.isExpired(entry):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.model
+
+    def contains(self, event_type, scope):
+        with self.lock:
+            return (event_type, scope) in self.entries
+
+    def getEntry(self, event_type, scope):
+        with self.lock:
+            return self.entries.get((event_type, scope))
+
+    def getStale(self, event_type, scope):
+        # Any model for the scope, regardless of ratings changes or age.
+        with self.lock:
+            entry = self.entries.get((event_type, scope))
+            if entry is None:
+                return None
+            self.stale_hits += 1
+            return entry.model
+
+    def put(self, event_type, scope, fingerprint, model):
+        key = (event_type, scope)
+        size = len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous.size
+            self.entries[key] = CacheEntry(fingerprint, model, size)
+            self.total_bytes += size
+            self.evict()
+
+    def isExpired(self, entry):
+        return time.monotonic() - entry.stored_at > self.ttl
+
+    def evict(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry.size
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,85 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import defaultdict
+from repository.backends import event_repository
+from repository.recommendation_store import RecommendationStore
+from service.single_recommendation import recommend_from_ratings
+from service.event_types import EVENT_TYPES
+from service.ratings import loadRatings
+from service.training_pool import TrainingPool
+from util.timing import addObserver, timed
+import numpy as np
+import argparse
+import os
+
+stage_timings = defaultdict(list)
+
+def record_timing(stage, elapsed):
+    stage_timings[stage].append(elapsed)
+
+def init_worker():
+    event_repository().afterFork()
+    # The batch is already spread over processes, so each worker trains inline.
+    TrainingPool().workers = 0
+    addObserver(record_timing)
+
+def precompute_chunk(event_types, user_ids):
+    stage_timings.clear()
+    specs = [EVENT_TYPES[event_type] for event_type in event_types]
+    # One ratings query covers every user and event type in the chunk.
+    ratings = loadRatings(specs, user_ids)
+
+    recommendations = defaultdict(list)
+    for spec in specs:
+        for user_id in ratings[spec.name].userIds():
+            with timed('total'):
+                recommendation = recommend_from_ratings(spec, user_id, ratings[spec.name])
+            recommendations[spec.name].append((user_id, recommendation))
+    return recommendations, dict(stage_timings)
+
+def precompute(event_types, workers, chunk_size):
+    store = RecommendationStore()
+    timings = defaultdict(list)
+    user_ids = set()
+    for event_type in event_types:
+        with timed('users'):
+            rated = event_repository().getRatedUserIds(EVENT_TYPES[event_type])
+        print(f"{event_type}: {len(rated)} users")
+        user_ids.update(rated)
+    user_ids = sorted(user_ids)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        futures = [
+            pool.submit(precompute_chunk, event_types, user_ids[start:start + chunk_size])
+            for start in range(0, len(user_ids), chunk_size)
+        ]
+        for future in as_completed(futures):
+            recommendations, chunk_timings = future.result()
+            with timed('store'):
+                for event_type, rows in recommendations.items():
+                    store.putMany(event_type, rows)
+            for stage, values in chunk_timings.items():
+                timings[stage].extend(values)
+    return timings
+
+def print_report(timings):
+    print(f"{'stage':<12}{'count':>8}{'total s':>10}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage, values in sorted(timings.items()):
+        values = np.asarray(values) * 1000
+        print(f"{stage:<12}{len(values):>8}{values.sum() / 1000:>10.2f}{values.mean():>10.2f}"
+              f"{np.percentile(values, 95):>10.2f}{values.max():>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute ranked upcoming events for every user with ratings.")
+    parser.add_argument('--event-type', action='append', choices=sorted(EVENT_TYPES), dest='event_types')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=50)
+    args = parser.parse_args()
+
+    parent_timings = defaultdict(list)
+    addObserver(lambda stage, elapsed: parent_timings[stage].append(elapsed))
+    timings = precompute(args.event_types or list(EVENT_TYPES), args.workers, args.chunk_size)
+    timings.update(parent_timings)
+    print_report(timings)
+
+if __name__ == '__main__':
+    main()
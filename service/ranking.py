@@ -0,0 +1,23 @@
+import numpy as np
+
+def topIndices(scores, offset=0, limit=None, exclude=None):
+    if exclude is not None and exclude.any():
+        candidates = np.flatnonzero(~exclude)
+        return candidates[topIndices(scores[candidates], offset, limit)]
+
+    n = len(scores)
+    stop = n if limit is None else min(n, offset + limit)
+    if offset >= stop:
+        return np.empty(0, dtype=np.intp)
+
+    if stop == n:
+        order = np.argsort(-scores, kind='stable')
+    else:
+        # Select the best `stop` scores without sorting the whole catalog. Ties at
+        # the cut-off are resolved by catalog position so pages stay consistent.
+        kth = np.partition(scores, n - stop)[n - stop]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:stop - len(above)]
+        picked = np.concatenate((above, ties))
+        order = picked[np.argsort(-scores[picked], kind='stable')]
+    return order[offset:stop]
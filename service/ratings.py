@@ -0,0 +1,53 @@
+from repository.backends import event_repository
+from service.content_based import EXCLUDE_RATED
+from util.timing import timed
+import numpy as np
+
+class EncodedRatings:
+    def __init__(self, features, rates, slices, event_ids, cursors):
+        self.features = features
+        self.rates = rates
+        self.slices = slices
+        self.event_ids = event_ids
+        self.cursors = cursors
+
+    def userIds(self):
+        return list(self.slices)
+
+    def forUser(self, user_id):
+        rows = self.slices.get(user_id, slice(0, 0))
+        return self.features[rows], self.rates[rows]
+
+    def forUsers(self, user_ids):
+        rows = [self.slices[user_id] for user_id in sorted(set(user_ids)) if user_id in self.slices]
+        if len(rows) == 1:
+            return self.features[rows[0]], self.rates[rows[0]]
+        index = np.concatenate([np.arange(r.start, r.stop) for r in rows]) if rows else np.empty(0, dtype=np.intp)
+        return self.features[index], self.rates[index]
+
+    def ratedEvents(self, user_ids):
+        rows = [self.slices[user_id] for user_id in set(user_ids) if user_id in self.slices]
+        return np.concatenate([self.event_ids[r] for r in rows]) if rows else np.empty(0, dtype=np.int64)
+
+def loadRatings(specs, user_ids, since=None, until=None):
+    repository = event_repository()
+    with timed('ratings'):
+        if hasattr(repository, 'getEncodedRatesForUsers'):
+            # Snapshot backends store the encoded columns and return them as they are.
+            encoded = repository.getEncodedRatesForUsers(specs, user_ids, since, until)
+        else:
+            # Encoded partition by partition while the rows stream in.
+            encoded = repository.getEventRatesForUsers(specs, user_ids, since, until).types
+    # Per-user training sets are views into each type's encoded block.
+    return {event_type: EncodedRatings(*columns) for event_type, columns in encoded.items()}
+
+def loadRatedEvents(spec, user_ids):
+    # Upcoming events the users rated, for callers that rank without their
+    # ratings; None when exclusion is off or the query fails.
+    if not EXCLUDE_RATED:
+        return None
+    try:
+        with timed('ratings'):
+            return event_repository().getRatedEventIds(spec, user_ids)
+    except Exception:
+        return None
@@ -1,39 +1,50 @@
-from repository.event_repository import EventRepository
-from service.content_based import predictSport, predictMusical, predictNature, predictStagePlay
+from repository.recommendation_store import RecommendationStore
+from service.content_based import predictEvents, rankCatalog
+from service.catalog_cache import CatalogCache
+from service.global_models import GlobalModels
+from service.event_types import EVENT_TYPES
+from service.ratings import loadRatings, loadRatedEvents
+from service import incremental
+from util.timing import timed
+import numpy as np
+
+def make_recommendation(event_type, user_id, limit=None, offset=0):
+    with timed('snapshot'):
+        recommendation = RecommendationStore().get(event_type, user_id)
+    if recommendation is not None:
+        recommendation = current_events(EVENT_TYPES[event_type], user_id, recommendation)
+        return recommendation[offset:] if limit is None else recommendation[offset:offset + limit]
+    return make_live_recommendation(event_type, user_id, limit, offset)
+
+def current_events(spec, user_id, recommendation):
+    # A stored list can be up to a day old: drop the events that have started or
+    # left the catalog since, and those the user has rated since, before paging.
+    ids = np.array([event["id"] for event in recommendation])
+    keep = np.isin(ids, CatalogCache().get(spec).ids)
+    rated = loadRatedEvents(spec, [user_id])
+    if rated:
+        keep &= ~np.isin(ids, rated)
+    return [event for event, kept in zip(recommendation, keep.tolist()) if kept]
+
+def make_live_recommendation(event_type, user_id, limit=None, offset=0):
+    spec = EVENT_TYPES[event_type]
+    if incremental.enabled():
+        try:
+            model = incremental.user_model(spec, user_id)
+        except Exception:
+            model = GlobalModels().get(spec)
+        return rankCatalog(model, spec, limit, offset, loadRatedEvents(spec, [user_id]))
 
-def make_recommendation(event_type, user_id):
-    try:
-        if event_type == 'Sport':
-            dataset = EventRepository().getSportEventRatesUser(user_id)
-            return predictSport(dataset=dataset)
-    except:
-        if event_type == 'Sport':
-            dataset = EventRepository().getSportEventRates()
-            return predictSport(dataset=dataset)
-        
-    try:
-        if event_type == 'Musical':
-            dataset = EventRepository().getMusicalEventRatesUser(user_id)
-            return predictMusical(dataset=dataset)
-    except:
-        if event_type == 'Musical':
-            dataset = EventRepository().getMusicalEventRates()
-            return predictMusical(dataset=dataset)
-    
     try:
-        if event_type == 'Nature':
-            dataset = EventRepository().getNatureEventRatesUser(user_id)
-            return predictNature(dataset=dataset)
-    except:
-        if event_type == 'Nature':
-            dataset = EventRepository().getNatureEventRates()
-            return predictNature(dataset=dataset)
-    
+        ratings = loadRatings([spec], [user_id])[spec.name]
+    except Exception:
+        return rankCatalog(GlobalModels().get(spec), spec, limit, offset, loadRatedEvents(spec, [user_id]))
+    return recommend_from_ratings(spec, user_id, ratings, limit, offset)
+
+def recommend_from_ratings(spec, user_id, ratings, limit=None, offset=0):
+    features, rates = ratings.forUser(user_id)
+    rated = ratings.ratedEvents([user_id])
     try:
-        if event_type == 'StagePlay':
-            dataset = EventRepository().getStagePlayEventRatesUser(user_id)
-            return predictStagePlay(dataset=dataset)
-    except:
-        if event_type == 'StagePlay':
-            dataset = EventRepository().getStagePlayEventRates()
-            return predictStagePlay(dataset=dataset)
+        return predictEvents(spec, features, rates, scope=user_id, limit=limit, offset=offset, rated=rated)
+    except Exception:
+        return rankCatalog(GlobalModels().get(spec), spec, limit, offset, rated)
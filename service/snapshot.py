@@ -0,0 +1,104 @@
+from repository.backends import event_repository
+from repository.snapshot_repository import RATING_ARRAYS, EVENT_ARRAYS
+from service.event_types import EVENT_TYPES, FEATURE_COLUMNS, encodeFrame
+from service.ratings import loadRatings
+import numpy as np
+import argparse
+import shutil
+import json
+import time
+import os
+
+def export_ratings(spec, chunk_size):
+    user_ids = sorted(event_repository().getRatedUserIds(spec))
+    if user_ids and not (0 <= user_ids[0] and user_ids[-1] <= np.iinfo(np.int32).max):
+        raise ValueError(f"user ids of {spec.name} do not fit the snapshot's int32 column")
+
+    features, rates, event_ids, cursors, counts = [], [], [], [], []
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        ratings = loadRatings([spec], chunk)[spec.name]
+        for user_id in chunk:
+            rows = ratings.slices.get(user_id, slice(0, 0))
+            # Ordered by the rate cursor so incremental windows stay slices.
+            order = np.argsort(ratings.cursors[rows], kind='stable')
+            features.append(ratings.features[rows][order])
+            rates.append(ratings.rates[rows][order])
+            event_ids.append(ratings.event_ids[rows][order])
+            cursors.append(ratings.cursors[rows][order])
+            counts.append(len(order))
+
+    return {
+        "user_ids": np.asarray(user_ids, dtype=np.int32),
+        "offsets": np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        "features": np.concatenate(features) if features else np.empty((0, len(FEATURE_COLUMNS)), dtype=np.int8),
+        "rates": np.concatenate(rates).astype(np.int8) if rates else np.empty(0, dtype=np.int8),
+        "event_ids": np.concatenate(event_ids).astype(np.int64) if event_ids else np.empty(0, dtype=np.int64),
+        "cursor": cursor_array(cursors),
+    }
+
+def cursor_array(cursors):
+    cursor = np.concatenate(cursors) if cursors else np.empty(0, dtype=np.int64)
+    if cursor.dtype == object:
+        # Memory-mapped arrays cannot hold Python objects.
+        raise ValueError("the snapshot needs a numeric EVENT_RATE_CURSOR_COLUMN")
+    return cursor
+
+def export_events(spec):
+    events = event_repository().getEvents(spec)
+    return events, {
+        "event_ids": events["id"].to_numpy(dtype=np.int64),
+        "features": encodeFrame(spec, events),
+        "starts_at": events["starts_at"].to_numpy(dtype=np.float64),
+    }
+
+def export(event_types, directory, chunk_size=1000):
+    os.makedirs(directory, exist_ok=True)
+    exported = {}
+    for event_type in event_types:
+        spec = EVENT_TYPES[event_type]
+        ratings = export_ratings(spec, chunk_size)
+        events, event_arrays = export_events(spec)
+
+        # Written next to the live snapshot and swapped in, so readers never see
+        # a partial export.
+        target = os.path.join(directory, event_type)
+        temporary = f"{target}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        for name in RATING_ARRAYS:
+            np.save(os.path.join(temporary, f"ratings_{name}.npy"), ratings[name])
+        for name in EVENT_ARRAYS:
+            np.save(os.path.join(temporary, f"events_{name}.npy"), event_arrays[name])
+        metadata = {
+            "categories": list(spec.categories),
+            "event_type": events["event_type"].iloc[0] if len(events) else spec.name,
+            "exported_at": time.time(),
+            "users": len(ratings["user_ids"]),
+            "ratings": len(ratings["rates"]),
+            "events": len(events),
+        }
+        with open(os.path.join(temporary, "metadata.json"), "w") as file:
+            json.dump(metadata, file)
+
+        previous = f"{target}.{os.getpid()}.old"
+        if os.path.exists(target):
+            os.replace(target, previous)
+        os.replace(temporary, target)
+        shutil.rmtree(previous, ignore_errors=True)
+        exported[event_type] = metadata
+    return exported
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ratings and events per event type to a memory-mapped snapshot "
+                                                 "for REPOSITORY_BACKEND=snapshot.")
+    parser.add_argument('--event-type', action='append', choices=sorted(EVENT_TYPES), dest='event_types')
+    parser.add_argument('--directory', default=os.environ.get('SNAPSHOT_DIR', 'snapshot'))
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    for event_type, metadata in export(args.event_types or list(EVENT_TYPES), args.directory, args.chunk_size).items():
+        print(f"{event_type}: {metadata['users']} users, {metadata['ratings']} ratings, {metadata['events']} events")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+from service.event_types import EVENT_TYPES
+import numpy as np
+import argparse
+import sqlite3
+import time
+import os
+
+EVENT_TABLE = """
+CREATE TABLE {table} (
+    id         INTEGER PRIMARY KEY,
+    event_type TEXT    NOT NULL,
+    category   TEXT,
+    price      REAL,
+    start_date TEXT    NOT NULL,
+    end_date   TEXT    NOT NULL,
+    private    INTEGER
+);
+CREATE INDEX {table}_start_date_idx ON {table} (start_date);
+"""
+
+RATE_TABLE = """
+CREATE TABLE event_rate (
+    id         INTEGER PRIMARY KEY,
+    user_id    INTEGER NOT NULL,
+    event_type TEXT    NOT NULL,
+    event_id   INTEGER NOT NULL,
+    rate       INTEGER NOT NULL
+);
+CREATE INDEX event_rate_user_idx ON event_rate (user_id, event_type, event_id);
+"""
+
+def timestamps(seconds):
+    # The 'YYYY-MM-DD HH:MM:SS' form that SQLite's datetime('now') compares against.
+    text = np.datetime_as_string(seconds.astype('datetime64[s]'), unit='s')
+    return np.char.replace(text, 'T', ' ')
+
+def generate_events(rng, spec, count, now):
+    category = rng.integers(0, len(spec.categories), count)
+    free = rng.random(count) < 0.3
+    price = np.where(free, np.nan, np.round(rng.uniform(5, 150, count), 2))
+    # Half the events are in the past (the ones most ratings refer to), half upcoming.
+    day = np.floor(rng.uniform(-365, 365, count))
+    hour = rng.integers(9, 22, count)
+    start = now - now % 86400 + (day * 24 + hour) * 3600
+    end = start + rng.integers(1, 6, count) * 3600
+    private = rng.random(count) < 0.1
+    return {
+        "category": np.asarray(spec.categories)[category],
+        "category_code": category,
+        "free": free,
+        "price": price,
+        "start": start,
+        "end": end,
+        "hour": hour,
+        "private": private,
+    }
+
+def generate_ratings(rng, spec, events, users, ratings_per_user):
+    counts = rng.poisson(ratings_per_user, users)
+    user_ids = np.repeat(np.arange(1, users + 1), counts)
+    event_index = rng.integers(0, len(events["start"]), len(user_ids))
+    pairs = np.unique(np.column_stack((user_ids, event_index)), axis=0)
+    user_ids, event_index = pairs[:, 0], pairs[:, 1]
+
+    # Every user prefers one category, free or paid events and an hour of the day,
+    # so the rates carry a signal the models can learn.
+    favourite = rng.integers(0, len(spec.categories), users + 1)[user_ids]
+    likes_free = (rng.random(users + 1) < 0.5)[user_ids]
+    preferred_hour = rng.integers(8, 23, users + 1)[user_ids]
+    score = (3
+             + 1.5 * (events["category_code"][event_index] == favourite)
+             + 0.8 * (events["free"][event_index] == likes_free)
+             - 0.15 * np.abs(events["hour"][event_index] - preferred_hour)
+             + rng.normal(0, 0.7, len(user_ids)))
+    rates = np.clip(np.round(score), 1, 5).astype(np.int64)
+    return user_ids, event_index + 1, rates
+
+def generate(path, users, events, ratings_per_user, seed=0):
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    if os.path.exists(path):
+        os.remove(path)
+
+    connection = sqlite3.connect(path)
+    rows = {}
+    with connection:
+        connection.executescript(RATE_TABLE)
+        for spec in EVENT_TYPES.values():
+            connection.executescript(EVENT_TABLE.format(table=spec.table))
+            generated = generate_events(rng, spec, events, now)
+            connection.executemany(
+                f"INSERT INTO {spec.table} (id, event_type, category, price, start_date, end_date, private) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip(range(1, events + 1), [spec.name] * events, generated["category"].tolist(),
+                    [None if np.isnan(price) else price for price in generated["price"].tolist()],
+                    timestamps(generated["start"]).tolist(), timestamps(generated["end"]).tolist(),
+                    generated["private"].astype(int).tolist()),
+            )
+
+            user_ids, event_ids, rates = generate_ratings(rng, spec, generated, users, ratings_per_user)
+            connection.executemany(
+                "INSERT INTO event_rate (user_id, event_type, event_id, rate) VALUES (?, ?, ?, ?)",
+                zip(user_ids.tolist(), [spec.name] * len(rates), event_ids.tolist(), rates.tolist()),
+            )
+            rows[spec.name] = len(rates)
+    connection.execute("ANALYZE")
+    connection.close()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic events database for the SQLite repository backend.")
+    parser.add_argument('--path', default=os.environ.get('SQLITE_DATABASE_PATH', 'events.sqlite3'))
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=500, help="events per event type")
+    parser.add_argument('--ratings-per-user', type=float, default=20, help="mean ratings per user and event type")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = generate(args.path, args.users, args.events, args.ratings_per_user, args.seed)
+    for event_type, count in rows.items():
+        print(f"{event_type}: {args.events} events, {count} ratings")
+    print(f"wrote {args.path} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sklearn.model_selection import train_test_split
+from service.engines import makeModel
+from service.model_cache import ModelCache
+from repository.model_registry import ModelRegistry
+from util.singleton import singleton
+from util.timing import record
+import multiprocessing
+import atexit
+import threading
+import time
+import os
+
+def trainModel(spec, features, rates):
+    X_train, X_test, y_train, y_test = train_test_split(features, rates, test_size=0.2, random_state=42)
+    model = makeModel(spec, y_train)
+    model.fit(X_train, y_train)
+    return model
+
+@singleton
+class TrainingPool:
+    def __init__(self):
+        self.workers = int(os.environ.get('TRAINING_WORKERS', 2))
+        self.start_method = os.environ.get('TRAINING_START_METHOD', 'forkserver')
+        self.persist = os.environ.get('MODEL_REGISTRY_PERSIST_SCOPES', 'true').lower() == 'true'
+        self.executor = None
+        self.executor_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.inflight = {}
+
+    def submit(self, spec, scope, dataset_fingerprint, features, rates):
+        key = (spec.name, scope, dataset_fingerprint)
+        with self.lock:
+            # Concurrent requests for the same ratings share one training job. Its
+            # future is registered here and the job started after the lock is
+            # released, since an inline fit can take seconds.
+            future = self.inflight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self.inflight[key] = future
+
+        submitted_at = time.perf_counter()
+        try:
+            trained = self.train(spec, features, rates)
+        except Exception as exception:
+            trained = Future()
+            trained.set_exception(exception)
+        trained.add_done_callback(lambda done: self.complete(key, future, done, submitted_at))
+        return future
+
+    def train(self, spec, features, rates):
+        if self.workers == 0:
+            future = Future()
+            self.trainInto(future, spec, features, rates)
+            return future
+
+        executor = self.getExecutor()
+        try:
+            pooled = executor.submit(trainModel, spec, features, rates)
+        except BrokenProcessPool:
+            self.discardExecutor(executor)
+            future = Future()
+            self.trainInto(future, spec, features, rates)
+            return future
+
+        future = Future()
+
+        def forward(done):
+            exception = done.exception()
+            if isinstance(exception, BrokenProcessPool):
+                # A worker died (e.g. killed for memory) and took the pool with it:
+                # replace the pool for later jobs and train this one in a thread.
+                self.discardExecutor(executor)
+                threading.Thread(target=self.trainInto, args=(future, spec, features, rates), daemon=True).start()
+            elif exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(done.result())
+        pooled.add_done_callback(forward)
+        return future
+
+    def trainInto(self, future, spec, features, rates):
+        try:
+            future.set_result(trainModel(spec, features, rates))
+        except Exception as exception:
+            future.set_exception(exception)
+
+    def getExecutor(self):
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                )
+                atexit.register(self.executor.shutdown)
+            return self.executor
+
+    def discardExecutor(self, executor):
+        with self.executor_lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
+
+    def complete(self, key, future, done, submitted_at):
+        # Runs on the pool's management thread, which delivers every job's result:
+        # hand the result over here and leave the pickling to publish().
+        record('fit', time.perf_counter() - submitted_at)
+        exception = done.exception()
+        if exception is not None:
+            future.set_exception(exception)
+            with self.lock:
+                self.inflight.pop(key, None)
+            return
+        future.set_result(done.result())
+        threading.Thread(target=self.publish, args=(key, future.result()), daemon=True).start()
+
+    def publish(self, key, model):
+        # Publish before dropping the in-flight entry so no request sees neither.
+        try:
+            event_type, scope, dataset_fingerprint = key
+            ModelCache().put(event_type, scope, dataset_fingerprint, model)
+            if self.persist:
+                ModelRegistry().save(event_type, scope, model, {"fingerprint": dataset_fingerprint})
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {"workers": self.workers, "inflight": len(self.inflight)}
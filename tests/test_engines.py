@@ -0,0 +1,63 @@
+from service.engines import LookupTableClassifier, forest, makeModel, updateModel, expectedRates
+from service.event_types import EVENT_TYPES
+import copy
+import numpy as np
+
+def ratings(rng, n, n_categories=4):
+    features = np.column_stack((
+        rng.integers(-1, n_categories, n),
+        rng.integers(-1, 2, n),
+        rng.integers(-1, 24, n),
+        rng.integers(-1, 24, n),
+        rng.integers(-1, 2, n),
+    )).astype(np.int8)
+    return features, rng.integers(1, 6, n)
+
+def assert_same(model, other):
+    np.testing.assert_array_equal(model.classes_, other.classes_)
+    np.testing.assert_array_equal(model.cell_ids_, other.cell_ids_)
+    np.testing.assert_allclose(model.cell_counts_, other.cell_counts_)
+    np.testing.assert_allclose(model.coarse_counts_, other.coarse_counts_)
+    np.testing.assert_allclose(model.table_, other.table_)
+
+def test_partial_fit_equals_fit():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        features, rates = ratings(rng, int(rng.integers(2, 200)))
+        model = LookupTableClassifier()
+        for batch in np.array_split(np.arange(len(rates)), int(rng.integers(1, 5))):
+            model.partial_fit(features[batch], rates[batch])
+        assert_same(model, LookupTableClassifier().fit(features, rates))
+        np.testing.assert_allclose(model.predict_proba(features),
+                                   LookupTableClassifier().fit(features, rates).predict_proba(features))
+
+def test_partial_fit_adds_classes():
+    rng = np.random.default_rng(1)
+    features, rates = ratings(rng, 100)
+    rates[:50] = np.minimum(rates[:50], 3)
+    rates[50:] = 5
+    model = LookupTableClassifier().partial_fit(features[:50], rates[:50])
+    model.partial_fit(features[50:], rates[50:])
+    assert_same(model, LookupTableClassifier().fit(features, rates))
+
+def test_forest_update_keeps_probabilities():
+    rng = np.random.default_rng(2)
+    features, rates = ratings(rng, 60)
+    model = forest(None).fit(features, rates)
+    for _ in range(30):
+        # One new rating at a time, which covers a single class.
+        new_features, new_rates = ratings(rng, 1)
+        new_rates[:] = rng.choice(model.classes_)
+        updated = updateModel(model, new_features, new_rates, 60 + 1, max_trees=1000)
+        assert updated is not None
+        model = updated
+    assert all(tree.tree_.value.sum() > 0 for tree in model.estimators_)
+    np.testing.assert_allclose(model.predict_proba(features).sum(axis=1), 1)
+
+def test_logistic_fits_a_single_class():
+    spec = copy.copy(EVENT_TYPES['Sport'])
+    spec.engine = 'logistic'
+    features, rates = ratings(np.random.default_rng(3), 20)
+    rates[:] = 4
+    model = makeModel(spec, rates).fit(features, rates)
+    np.testing.assert_allclose(expectedRates(model, features), 4)
@@ -0,0 +1,34 @@
+from service.ranking import topIndices
+import numpy as np
+
+def expected(scores, offset, limit, exclude=None):
+    order = np.argsort(-scores, kind='stable')
+    if exclude is not None:
+        order = order[~exclude[order]]
+    return order[offset:] if limit is None else order[offset:offset + limit]
+
+def test_matches_stable_argsort():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        n = int(rng.integers(0, 60))
+        # Few distinct values, so ties at the cut-off are common.
+        scores = rng.integers(0, 5, n).astype(np.float64)
+        offset = int(rng.integers(0, n + 3))
+        limit = None if rng.random() < 0.2 else int(rng.integers(0, n + 3))
+        np.testing.assert_array_equal(topIndices(scores, offset, limit), expected(scores, offset, limit))
+
+def test_exclude_mask():
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        n = int(rng.integers(0, 60))
+        scores = rng.random(n).round(1)
+        exclude = rng.random(n) < rng.random()
+        offset = int(rng.integers(0, n + 3))
+        limit = None if rng.random() < 0.2 else int(rng.integers(0, n + 3))
+        np.testing.assert_array_equal(topIndices(scores, offset, limit, exclude),
+                                      expected(scores, offset, limit, exclude))
+
+def test_pages_are_consistent():
+    scores = np.zeros(10)
+    pages = [topIndices(scores, offset, 3) for offset in range(0, 10, 3)]
+    np.testing.assert_array_equal(np.concatenate(pages), np.arange(10))
@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+import time
+
+observers = []
+
+def addObserver(observer):
+    observers.append(observer)
+
+def removeObserver(observer):
+    observers.remove(observer)
+
+def record(stage, elapsed):
+    for observer in observers:
+        observer(stage, elapsed)
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)